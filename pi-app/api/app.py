@@ -1,10 +1,48 @@
+from services import startup
+startup.mark("launch")      # interpreter and uvicorn, up to importing the app
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, Response, PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from api.routes import recipes, orders, admin
+from api.routes import recipes, orders, admin, events
+from db.database import Database
+from hardware.gateway import get_hardware
+from services.event_service import broadcaster
+from services import metrics
+
+def _publish_change(event: str, data: dict):
+    # Pour-plan invalidations are internal; kiosks only care about menu and inventory
+    if event != "pour_plans":
+        broadcaster.publish(event, data)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+    # Push serial and menu/inventory changes to /api/events clients
+    broadcaster.attach(loop)
+    Database.add_change_listener(_publish_change)
+    # Local mode: serial frames are read on this event loop (loop.add_reader).
+    # Multi-process mode: subscribe to the hardware daemon's events instead.
+    hardware = get_hardware()
+    hardware.start(loop, broadcaster.publish)
+    if not hardware.remote:
+        # Background jobs run once per machine — in the hardware daemon when there is one
+        # Store-and-forward sync to the central server (no-op without sync_url)
+        admin.sync_service.start()
+        # Daily archival of old transactions (no-op without transaction_retention_days)
+        admin.retention_service.start()
+    startup.mark("startup")
+    print(f"🚀 Mixion API serving after {startup.summary()}")
+    yield
+    if not hardware.remote:
+        admin.retention_service.stop()
+        admin.sync_service.stop()
+    hardware.stop()
 
-app = FastAPI(title="Mixion Pi API")
+app = FastAPI(title="Mixion Pi API", lifespan=lifespan)
 
 # ── No-Cache Middleware (dev mode) ───────────────────────────────────────────
 class NoCacheMiddleware(BaseHTTPMiddleware):
@@ -19,10 +57,8 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
         return response
 
 app.add_middleware(NoCacheMiddleware)
-
-# Initialize DB on startup
-from db.database import Database
-_db = Database()
+# Outermost, so the latency it records includes the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static frontend
 app.mount("/static", StaticFiles(directory="web/static"), name="static")
@@ -30,6 +66,19 @@ app.mount("/static", StaticFiles(directory="web/static"), name="static")
 app.include_router(recipes.router, prefix="/api")
 app.include_router(orders.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
+app.include_router(events.router, prefix="/api")
+
+# ── Metrics ─────────────────────────────────────────────────────────────────
+metrics.DEVICE_ONLINE.set_function(lambda: 1 if get_hardware().device_online else 0)
+metrics.INFLIGHT_COMMANDS.set_function(lambda: get_hardware().status()["inflight_orders"])
+metrics.QUEUE_DEPTH.set_function(lambda: {
+    state: count for state, count in get_hardware().queue().items() if state in ("queued", "running")
+})
+metrics.EVENT_CLIENTS.set_function(lambda: broadcaster.client_count)
+
+@app.get("/metrics", include_in_schema=False)
+def serve_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def serve_ui():
@@ -43,3 +92,4 @@ def serve_login():
 def serve_admin_page():
     return FileResponse("web/admin.html")
 
+startup.mark("import")
@@ -1,43 +1,91 @@
 import secrets
 import os
+import json
 from typing import List
-from fastapi import APIRouter, Header, HTTPException, Depends, Body
+from fastapi import APIRouter, Header, HTTPException, Depends, Body, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from api.routes.recipes import _etag_matches, _not_modified
 from db.database import Database
+from db.profiler import profiler
+from db.repositories.session_repo import SessionRepository
+from hardware.gateway import get_hardware
+from services import startup
+from services.event_service import broadcaster
+from services.inventory_service import ForecastService
+from services.retention_service import RetentionService
+from services.sync_service import SyncService
 
-_active_tokens: set[str] = set()
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASS = os.getenv("ADMIN_PASS", "admin123")
 
 router = APIRouter()
 
+def get_db() -> Database:
+    return Database.shared()
+
+# Tokens live in SQLite so every API worker process accepts them
+sessions = SessionRepository(get_db())
+
 def require_auth(x_admin_token: str = Header(default="")):
-    if x_admin_token not in _active_tokens:
+    if not sessions.is_valid(x_admin_token):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 @router.post("/admin/login")
 def admin_login(data: dict):
     if data.get("username") == ADMIN_USER and data.get("password") == ADMIN_PASS:
         token = secrets.token_hex(32)
-        _active_tokens.add(token)
+        sessions.create(token, ADMIN_USER)
         return {"token": token}
     raise HTTPException(status_code=403, detail="Invalid credentials")
 
 @router.post("/admin/logout")
 def admin_logout(x_admin_token: str = Header(default="")):
-    _active_tokens.discard(x_admin_token)
+    sessions.delete(x_admin_token)
     return {"status": "logged_out"}
 
-_db: Database | None = None
-def get_db() -> Database:
-    global _db
-    if _db is None:
-        _db = Database()
-    return _db
+hardware = get_hardware()
+# In multi-process mode the hardware daemon runs the sync worker; talk to that one
+sync_service = hardware.sync_service if hardware.remote else SyncService()
+retention_service = RetentionService()
+forecast_service = ForecastService()
+
+# ── Lookup lists ────────────────────────────────────────────────────────────
+# Every list GET takes ?fields=id,name to project columns, and ?limit=N with
+# ?cursor=<last id> for keyset pages; X-Next-Cursor is set while a full page
+# came back. /admin/bootstrap returns all of them at once.
+LIST_PAGE_MAX = 1000
+
+def list_page(fields: str | None = None, limit: int | None = None, cursor: str | None = None) -> dict:
+    return {
+        "fields": [f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        "limit": max(1, min(limit, LIST_PAGE_MAX)) if limit is not None else None,
+        "cursor": cursor,
+    }
+
+def _list_response(name: str, page: dict, response: Response):
+    try:
+        rows = get_db().admin_list(name, **page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["limit"] is not None and len(rows) == page["limit"]:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return rows
+
+@router.get("/admin/bootstrap", dependencies=[Depends(require_auth)])
+def get_bootstrap(request: Request):
+    # Versioned by the menu generation, which every catalog or stock change bumps
+    db = get_db()
+    etag = f'"admin-{db.menu_epoch}-{db.menu_generation}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    data = db.admin_bootstrap()
+    etag = f'"admin-{data["version"]}"'
+    return JSONResponse(data, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 # ── Categories & Groups ─────────────────────────────────────────────────────
 @router.get("/admin/categories", dependencies=[Depends(require_auth)])
-def get_categories():
-    return get_db().admin_get_categories()
+def get_categories(response: Response, page: dict = Depends(list_page)):
+    return _list_response("categories", page, response)
 
 @router.post("/admin/categories", dependencies=[Depends(require_auth)])
 def add_category(data: dict):
@@ -55,8 +103,8 @@ def delete_category(cid: int):
     return {"status": "deleted"}
 
 @router.get("/admin/groups", dependencies=[Depends(require_auth)])
-def get_groups():
-    return get_db().admin_get_groups()
+def get_groups(response: Response, page: dict = Depends(list_page)):
+    return _list_response("groups", page, response)
 
 @router.post("/admin/groups", dependencies=[Depends(require_auth)])
 def add_group(data: dict):
@@ -75,8 +123,8 @@ def delete_group(gid: int):
 
 # ── Ingredient Types ────────────────────────────────────────────────────────
 @router.get("/admin/ingredient_types", dependencies=[Depends(require_auth)])
-def get_ingredient_types():
-    return get_db().admin_get_ingredient_types()
+def get_ingredient_types(response: Response, page: dict = Depends(list_page)):
+    return _list_response("ingredient_types", page, response)
 
 @router.post("/admin/ingredient_types", dependencies=[Depends(require_auth)])
 def add_ingredient_type(data: dict):
@@ -95,8 +143,8 @@ def delete_ingredient_type(tid: int):
 
 # ── Glasses ─────────────────────────────────────────────────────────────────
 @router.get("/admin/glasses", dependencies=[Depends(require_auth)])
-def get_glasses():
-    return get_db().admin_get_glasses()
+def get_glasses(response: Response, page: dict = Depends(list_page)):
+    return _list_response("glasses", page, response)
 
 @router.post("/admin/glasses", dependencies=[Depends(require_auth)])
 def add_glass(data: dict):
@@ -115,8 +163,8 @@ def delete_glass(gid: int):
 
 # ── Methods ─────────────────────────────────────────────────────────────────
 @router.get("/admin/methods", dependencies=[Depends(require_auth)])
-def get_methods():
-    return get_db().admin_get_methods()
+def get_methods(response: Response, page: dict = Depends(list_page)):
+    return _list_response("methods", page, response)
 
 @router.post("/admin/methods", dependencies=[Depends(require_auth)])
 def add_method(data: dict):
@@ -135,8 +183,8 @@ def delete_method(mid: int):
 
 # ── Extras ──────────────────────────────────────────────────────────────────
 @router.get("/admin/extras", dependencies=[Depends(require_auth)])
-def get_extras():
-    return get_db().admin_get_extras()
+def get_extras(response: Response, page: dict = Depends(list_page)):
+    return _list_response("extras", page, response)
 
 @router.post("/admin/extras", dependencies=[Depends(require_auth)])
 def add_extra(data: dict):
@@ -155,8 +203,8 @@ def delete_extra(eid: int):
 
 # ── Ingredients ─────────────────────────────────────────────────────────────
 @router.get("/admin/ingredients", dependencies=[Depends(require_auth)])
-def get_ingredients():
-    return get_db().admin_get_ingredients()
+def get_ingredients(response: Response, page: dict = Depends(list_page)):
+    return _list_response("ingredients", page, response)
 
 @router.post("/admin/ingredients", dependencies=[Depends(require_auth)])
 def add_ingredient(data: dict):
@@ -175,8 +223,8 @@ def delete_ingredient(iid: int):
 
 # ── Lines ───────────────────────────────────────────────────────────────────
 @router.get("/admin/lines", dependencies=[Depends(require_auth)])
-def get_lines():
-    return get_db().admin_get_lines()
+def get_lines(response: Response, page: dict = Depends(list_page)):
+    return _list_response("lines", page, response)
 
 @router.post("/admin/lines", dependencies=[Depends(require_auth)])
 def add_line(data: dict):
@@ -204,8 +252,13 @@ def delete_line(lid: int):
 
 # ── Bottles ─────────────────────────────────────────────────────────────────
 @router.get("/admin/bottles", dependencies=[Depends(require_auth)])
-def get_bottles():
-    return get_db().admin_get_bottles()
+def get_bottles(response: Response, page: dict = Depends(list_page)):
+    return _list_response("bottles", page, response)
+
+@router.get("/admin/bottles/forecast", dependencies=[Depends(require_auth)])
+def get_bottle_forecast():
+    """Consumption rates, predicted time-to-empty and drinks left per bottle, soonest empty first."""
+    return forecast_service.forecast()
 
 @router.post("/admin/bottles", dependencies=[Depends(require_auth)])
 def add_bottle(data: dict):
@@ -238,8 +291,8 @@ def delete_bottle(bid: int):
 
 # ── Drinks ──────────────────────────────────────────────────────────────────
 @router.get("/admin/drinks", dependencies=[Depends(require_auth)])
-def get_drinks():
-    return get_db().admin_get_drinks()
+def get_drinks(response: Response, page: dict = Depends(list_page)):
+    return _list_response("drinks", page, response)
 
 @router.post("/admin/drinks", dependencies=[Depends(require_auth)])
 def add_drink(data: dict):
@@ -274,19 +327,125 @@ def save_recipes_for_drink(drink_id: str, data: dict = Body(...)):
     get_db().admin_set_recipes_for_drink(drink_id, data)
     return {"status": "saved"}
 
+# ── Catalog import/export ───────────────────────────────────────────────────
+@router.get("/admin/catalog/export", dependencies=[Depends(require_auth)])
+def export_catalog():
+    catalog = get_db().admin_export_catalog()
+
+    def stream():
+        # One row per line, so a large menu is never serialized as one big string
+        yield "{\n"
+        for n, (key, value) in enumerate(catalog.items()):
+            sep = ",\n" if n < len(catalog) - 1 else "\n"
+            if isinstance(value, list):
+                yield f"{json.dumps(key)}: ["
+                for i, row in enumerate(value):
+                    yield ("\n" if i == 0 else ",\n") + json.dumps(row)
+                yield f"\n]{sep}"
+            else:
+                yield f"{json.dumps(key)}: {json.dumps(value)}{sep}"
+        yield "}\n"
+
+    filename = f"mixion-catalog-{catalog['exported_at'][:10]}.json"
+    return StreamingResponse(
+        stream(),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/admin/catalog/import", dependencies=[Depends(require_auth)])
+def import_catalog(data: dict = Body(...), dry_run: bool = False):
+    errors, counts = get_db().admin_import_catalog(data, dry_run=dry_run)
+    if errors:
+        raise HTTPException(status_code=422, detail={"errors": errors})
+    return {"status": "validated" if dry_run else "imported", "dry_run": dry_run, "counts": counts}
+
 # ── Logs ────────────────────────────────────────────────────────────────────
 @router.get("/admin/transactions", dependencies=[Depends(require_auth)])
-def get_transactions(limit: int = 100):
-    return get_db().admin_get_transactions(limit)
+def get_transactions(limit: int = 100, before_id: int | None = None, drink_id: str | None = None,
+                     status: str | None = None, since: str | None = None, until: str | None = None):
+    limit = max(1, min(limit, 1000))
+    return get_db().admin_get_transactions(limit, before_id, drink_id, status, since, until)
+
+@router.get("/admin/transactions/archive", dependencies=[Depends(require_auth)])
+def get_transaction_archive():
+    return {
+        "retention_days": retention_service.retention_days,
+        "last_run": retention_service.last_run,
+        "batches": retention_service.archive.list_batches(),
+    }
+
+@router.get("/admin/transactions/archive/{batch_id}", dependencies=[Depends(require_auth)])
+def get_transaction_archive_batch(batch_id: int):
+    rows = retention_service.archive.read_batch(batch_id)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Unknown archive batch")
+    return rows
+
+@router.post("/admin/transactions/archive", dependencies=[Depends(require_auth)])
+def archive_transactions(data: dict = Body(default={})):
+    days = int(data.get("older_than_days", retention_service.retention_days))
+    if days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    return retention_service.run_once(days)
+
+# ── Sales ───────────────────────────────────────────────────────────────────
+# Served from the trigger-maintained sales_rollup, never from the transaction log
+@router.get("/admin/sales/top", dependencies=[Depends(require_auth)])
+def get_top_sellers(since: str | None = None, until: str | None = None, limit: int = 10,
+                    status: str = "completed"):
+    limit = max(1, min(limit, 100))
+    return get_db().admin_get_top_sellers(since, until, limit, status)
+
+@router.get("/admin/sales/hourly", dependencies=[Depends(require_auth)])
+def get_hourly_sales(since: str | None = None, until: str | None = None):
+    import datetime
+    if since is None and until is None:
+        since = (datetime.datetime.now() - datetime.timedelta(hours=24)).isoformat()
+    return get_db().admin_get_hourly_sales(since, until)
+
+@router.get("/admin/sales/summary", dependencies=[Depends(require_auth)])
+def get_sales_summary(since: str | None = None, until: str | None = None):
+    return get_db().admin_get_sales_summary(since, until)
 
 # ── Status ──────────────────────────────────────────────────────────────────
 @router.get("/admin/status", dependencies=[Depends(require_auth)])
 def get_status():
     import datetime
-    from hardware.serial_client import SerialClient
-    serial = SerialClient()
+    status = hardware.status()
     return {
-        "device": "online" if serial.device_online else "offline",
+        "device": "online" if status["device_online"] else "offline",
         "server_time": datetime.datetime.now().isoformat(),
-        "active_sessions": len(_active_tokens)
+        "active_sessions": sessions.count(),
+        "inflight_orders": status["inflight_orders"],
+        "serial_frames": status["serial_frames"],
+        "serial_tx": status["serial_tx"],
+        "event_clients": broadcaster.client_count,
+        "startup": startup.report(),
     }
+
+# ── DB profiler ─────────────────────────────────────────────────────────────
+@router.get("/admin/db/profile", dependencies=[Depends(require_auth)])
+def get_db_profile(limit: int = 20, sort: str = "total"):
+    if sort not in ("total", "max", "count", "mean"):
+        raise HTTPException(status_code=400, detail="sort must be one of total, max, count, mean")
+    return profiler.report(limit=limit, sort=sort)
+
+@router.post("/admin/db/profile", dependencies=[Depends(require_auth)])
+def configure_db_profile(data: dict = Body(...)):
+    if data.get("reset"):
+        profiler.reset()
+    profiler.configure(enabled=data.get("enabled"), threshold_ms=data.get("threshold_ms"))
+    return {"enabled": profiler.enabled, "threshold_ms": profiler.threshold_ms}
+
+# ── Sync ────────────────────────────────────────────────────────────────────
+@router.get("/admin/sync", dependencies=[Depends(require_auth)])
+def get_sync_status():
+    return sync_service.stats()
+
+@router.post("/admin/sync", dependencies=[Depends(require_auth)])
+def trigger_sync():
+    if not sync_service.enabled:
+        raise HTTPException(status_code=400, detail="Sync is not configured (set sync_url in config.json)")
+    sync_service.wake()
+    return {"status": "scheduled"}
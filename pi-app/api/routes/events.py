@@ -0,0 +1,42 @@
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from db.database import Database
+from hardware.gateway import get_hardware
+from services.event_service import broadcaster
+
+router = APIRouter()
+
+db = Database.shared()
+hardware = get_hardware()
+
+KEEPALIVE_SEC = 15
+
+@router.get("/events")
+async def stream_events(request: Request):
+    """Server-Sent Events: device, heartbeat, pour, command, order, menu and inventory updates."""
+    queue = broadcaster.subscribe()
+
+    async def stream():
+        try:
+            yield broadcaster.format("hello", {
+                "device_online": hardware.device_online,
+                "menu_generation": db.menu_generation,
+            })
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield message
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
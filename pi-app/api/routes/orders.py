@@ -1,27 +1,52 @@
-from fastapi import APIRouter, HTTPException
-from services.pour_service import PourService
-from db.database import Database
-from hardware.serial_client import SerialClient
+from fastapi import APIRouter, Header, HTTPException
+from api.routes.admin import sessions
+from hardware.gateway import get_hardware
+from services.dispense_scheduler import MAX_PRIORITY, MIN_PRIORITY
 
 router = APIRouter()
 
-db = Database()
-serial = SerialClient()
-pour_service = PourService(db, serial)
+# This process's serial stack, or a client for the hardware daemon (multi-process mode)
+hardware = get_hardware()
+scheduler = getattr(hardware, "scheduler", None)        # local mode only
+pour_service = getattr(hardware, "pour_service", None)  # local mode only
+
+def _priority(data: dict, admin_token: str) -> int:
+    # Kiosks are unauthenticated; only an admin session may move an order up the queue
+    try:
+        priority = int(data.get("priority", MIN_PRIORITY))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="priority must be an integer")
+    if priority != MIN_PRIORITY and not sessions.is_valid(admin_token):
+        raise HTTPException(status_code=403, detail="Only an admin session can set an order priority")
+    return min(max(priority, MIN_PRIORITY), MAX_PRIORITY)
 
 @router.post("/order")
-def create_order(data: dict):
+def create_order(data: dict, x_admin_token: str = Header(default="")):
     drink_id = data.get("drink_id")
     if not drink_id:
         raise HTTPException(status_code=400, detail="drink_id required")
-    # PourService raises HTTPException(409) if unavailable
-    return pour_service.dispense(drink_id)
+    priority = _priority(data, x_admin_token)
+    # Raises HTTPException(409) if unavailable, 503 if the queue is full
+    return hardware.dispense(drink_id, priority=priority)
 
 @router.post("/create-order/")
-def create_order_with_extras(data: dict):
+def create_order_with_extras(data: dict, x_admin_token: str = Header(default="")):
     drink_id = data.get("drink_id")
     if not drink_id:
         raise HTTPException(status_code=400, detail="drink_id required")
+    priority = _priority(data, x_admin_token)
     # In the future, extras & price can be logged to the database.
     # For now, we process the hardware dispense exactly the same way.
-    return pour_service.dispense(drink_id)
+    return hardware.dispense(drink_id, priority=priority)
+
+@router.get("/order/{order_id}")
+def get_order_status(order_id: str):
+    # Order id, or a raw CMD msg_id
+    status = hardware.order_status(order_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown order")
+    return status
+
+@router.get("/queue")
+def get_queue():
+    return hardware.queue()
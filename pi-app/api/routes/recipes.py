@@ -1,21 +1,49 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
 from db.database import Database
-from hardware.serial_client import SerialClient
+from hardware.gateway import get_hardware
 
 router = APIRouter()
 
-db = Database()
-serial = SerialClient()
+db = Database.shared()
+hardware = get_hardware()
+
+# ── Conditional responses ───────────────────────────────────────────────────
+# Kiosks poll these endpoints; the ETag is derived from the menu generation so
+# an unchanged menu costs a 304 instead of the full payload.
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _menu_response(request: Request) -> Response:
+    online = hardware.device_online
+    generation, payload = db.get_menu_snapshot(device_online=online)
+    etag = f'"menu-{db.menu_epoch}-{generation}-{int(online)}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
 @router.get("/recipes")
-def get_recipes():
-    return db.get_all_drinks(device_online=serial.device_online)
+def get_recipes(request: Request):
+    return _menu_response(request)
 
 @router.get("/drinks")
-def get_drinks():
-    return db.get_all_drinks(device_online=serial.device_online)
+def get_drinks(request: Request):
+    return _menu_response(request)
 
 @router.get("/manual-extras/")
-def get_manual_extras():
-    return db.admin_get_extras()
-
+def get_manual_extras(request: Request):
+    etag = f'"extras-{db.menu_epoch}-{db.menu_generation}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    return JSONResponse(db.admin_get_extras(), headers={"ETag": etag, "Cache-Control": "no-cache"})
@@ -0,0 +1,283 @@
+"""
+benchmarks/bench.py — Hot-path benchmarks for the Mixion Pi App
+===============================================================
+Usage (from pi-app/):
+  python -m benchmarks.bench run --drinks 50,5000,50000 --out bench.json
+  python -m benchmarks.bench compare base.json bench.json --threshold 0.15
+
+`run` builds a synthetic catalog per size in a throwaway directory (each size
+in its own process, so caches and connection pools never leak between sizes)
+and times:
+  - Database.get_all_drinks         warm (cached snapshot) and cold (after a menu change)
+  - Database.check_drink_availability
+  - Database.deduct_bottles
+  - Database.admin_get_transactions
+  - POST /api/order                 end to end through the ASGI app, mock serial
+Each benchmark runs --rounds times and the round with the lowest p50 is kept.
+Results are written as JSON with p50/p95/p99 per benchmark.
+
+`compare` exits 1 if any benchmark's p50 or p95 got slower than the baseline
+by more than --threshold (relative) and --min-delta-ms (absolute).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = "50,5000"
+
+
+# ── Timing ────────────────────────────────────────────────────────────────────
+
+def _percentile(sorted_ms: list[float], pct: float) -> float:
+    # Nearest-rank percentile; exact for the sample we took, no interpolation
+    index = max(0, min(len(sorted_ms) - 1, int(round(pct / 100 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[index]
+
+
+def summarize(samples_ns: list[int]) -> dict:
+    ms = sorted(s / 1e6 for s in samples_ns)
+    return {
+        "n": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 4),
+        "min_ms": round(ms[0], 4),
+        "p50_ms": round(_percentile(ms, 50), 4),
+        "p95_ms": round(_percentile(ms, 95), 4),
+        "p99_ms": round(_percentile(ms, 99), 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def measure(fn, iterations: int, warmup: int, before=None) -> dict:
+    """Time fn() `iterations` times; before() runs untimed ahead of every call."""
+    for _ in range(warmup):
+        if before:
+            before()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+# ── One catalog size (runs inside a scratch directory) ──────────────────────
+
+def _best(rounds: list[dict]) -> dict:
+    # Like timeit: keep the least-disturbed round, scheduler noise only ever adds time
+    return min(rounds, key=lambda s: s["p50_ms"])
+
+
+def run_size(drinks: int, iterations: int, warmup: int, transactions: int, seed: int, rounds: int = 3) -> dict:
+    from benchmarks.synthetic import build_catalog, seed_transactions
+    from db import migrate
+    from db.database import Database
+    from hardware.serial_client import SerialClient
+
+    # Mock firmware before anything starts the real port
+    serial = SerialClient()
+    serial.use_mock_serial = True
+    serial.device_online = True
+    serial.heartbeat_timeout_sec = float("inf")
+
+    # Same schema and indexes as a deployed Pi (run.sh migrates before starting)
+    migrate.run_migrations()
+    db = Database()
+    catalog = build_catalog(drinks, seed=seed)
+    start = time.perf_counter()
+    errors, _ = db.admin_import_catalog(catalog)
+    if errors:
+        raise RuntimeError(f"Synthetic catalog rejected: {errors[:5]}")
+    import_sec = time.perf_counter() - start
+    drink_ids = [d["id"] for d in catalog["drinks"]]
+    seed_transactions(os.path.join("data", "mixion.db"), drink_ids, transactions, seed=seed)
+
+    poured = {r["drink_id"] for r in catalog["recipes"] if r["ingredient_id"] <= len(catalog["bottles"])}
+    unpoured = {r["drink_id"] for r in catalog["recipes"] if r["ingredient_id"] > len(catalog["bottles"])}
+    pourable = sorted(poured - unpoured)
+    rng = random.Random(seed)
+    category = catalog["categories"][0]
+
+    cases = {
+        "get_all_drinks[warm]": lambda: measure(lambda: db.get_all_drinks(), iterations, warmup),
+        "get_all_drinks[cold]": lambda: measure(
+            lambda: db.get_all_drinks(), max(10, iterations // 10), 2,
+            before=lambda: db.admin_update_category(category["id"], category["name"]),
+        ),
+        "check_drink_availability": lambda: measure(
+            lambda: db.check_drink_availability(rng.choice(drink_ids)), iterations, warmup),
+        "deduct_bottles": lambda: measure(lambda: db.deduct_bottles(rng.choice(pourable)), iterations, warmup),
+        "admin_get_transactions": lambda: measure(lambda: db.admin_get_transactions(100), iterations, warmup),
+    }
+    results = {name: _best([case() for _ in range(rounds)]) for name, case in cases.items()}
+
+    from fastapi.testclient import TestClient
+    from api.app import app
+    from api.routes import orders
+    orders.scheduler.max_queue = 10 ** 9    # measure the request, not admission control
+    with TestClient(app) as client:
+        def post_order():
+            response = client.post("/api/order", json={"drink_id": rng.choice(pourable)})
+            if response.status_code != 200:
+                raise RuntimeError(f"POST /api/order → {response.status_code}: {response.text}")
+        results["POST /api/order"] = _best([measure(post_order, iterations, warmup) for _ in range(rounds)])
+
+    return {
+        "drinks": drinks,
+        "recipes": len(catalog["recipes"]),
+        "transactions": transactions,
+        "rounds": rounds,
+        "import_sec": round(import_sec, 4),
+        "benchmarks": results,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args) -> int:
+    sizes = [int(s) for s in args.drinks.split(",") if s.strip()]
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for drinks in sizes:
+        print(f"⏱️  {drinks} drinks...", flush=True)
+        with tempfile.TemporaryDirectory(prefix="mixion-bench-") as workdir:
+            # The app serves web/ relative to the working directory
+            os.symlink(os.path.join(APP_DIR, "web"), os.path.join(workdir, "web"))
+            out = os.path.join(workdir, "result.json")
+            env = dict(os.environ, PYTHONPATH=APP_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            cmd = [sys.executable, "-m", "benchmarks.bench", "_size", str(drinks), out,
+                   "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+                   "--transactions", str(args.transactions or drinks * 4), "--seed", str(args.seed),
+                   "--rounds", str(args.rounds)]
+            proc = subprocess.run(cmd, cwd=workdir, env=env,
+                                  stdout=None if args.verbose else subprocess.DEVNULL)
+            if proc.returncode != 0:
+                print(f"❌ {drinks} drinks: benchmark process failed ({proc.returncode})")
+                return proc.returncode
+            with open(out) as f:
+                report["sizes"][str(drinks)] = json.load(f)
+        _print_size(report["sizes"][str(drinks)])
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.out}")
+    return 0
+
+
+def _print_size(result: dict):
+    print(f"   {result['drinks']} drinks / {result['recipes']} recipes / "
+          f"{result['transactions']} transactions (import {result['import_sec']}s)")
+    for name, s in result["benchmarks"].items():
+        print(f"   {name:<28} p50 {s['p50_ms']:>9.3f} ms  p95 {s['p95_ms']:>9.3f} ms  p99 {s['p99_ms']:>9.3f} ms")
+
+
+# ── Compare ───────────────────────────────────────────────────────────────────
+
+def compare(args) -> int:
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"🔍 {base.get('commit') or args.base} → {head.get('commit') or args.head} "
+          f"(threshold {args.threshold:.0%}, min delta {args.min_delta_ms} ms)")
+
+    regressions = 0
+    for size, head_size in head["sizes"].items():
+        base_size = base["sizes"].get(size)
+        if base_size is None:
+            continue
+        print(f"   {size} drinks")
+        for name, new in head_size["benchmarks"].items():
+            old = base_size["benchmarks"].get(name)
+            if old is None:
+                continue
+            flags = []
+            for stat in ("p50_ms", "p95_ms"):
+                delta = new[stat] - old[stat]
+                ratio = new[stat] / old[stat] if old[stat] else float("inf")
+                if ratio > 1 + args.threshold and delta > args.min_delta_ms:
+                    flags.append(f"{stat[:3]} +{(ratio - 1):.0%}")
+            change = (new["p50_ms"] / old["p50_ms"] - 1) if old["p50_ms"] else 0.0
+            mark = "❌ REGRESSION " + ", ".join(flags) if flags else "✅"
+            print(f"     {name:<28} p50 {old['p50_ms']:>9.3f} → {new['p50_ms']:>9.3f} ms ({change:+.0%})  {mark}")
+            regressions += bool(flags)
+
+    if regressions:
+        print(f"❌ {regressions} regression(s)")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmarks and write a JSON report")
+    p_run.add_argument("--drinks", default=DEFAULT_SIZES, help=f"comma-separated catalog sizes (default {DEFAULT_SIZES})")
+    p_run.add_argument("--iterations", type=int, default=200)
+    p_run.add_argument("--warmup", type=int, default=20)
+    p_run.add_argument("--rounds", type=int, default=3, help="repeat each benchmark, keep the best round")
+    p_run.add_argument("--transactions", type=int, default=0, help="history rows to seed (default 4 × drinks)")
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--out", default="bench.json")
+    p_run.add_argument("--verbose", action="store_true", help="show app output from the benchmark processes")
+
+    p_cmp = sub.add_parser("compare", help="compare two reports and flag regressions")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("head")
+    p_cmp.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts (default 0.15)")
+    p_cmp.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+
+    # Internal: one size inside a scratch directory, spawned by `run`
+    p_size = sub.add_parser("_size")
+    p_size.add_argument("drinks", type=int)
+    p_size.add_argument("out")
+    p_size.add_argument("--iterations", type=int, default=200)
+    p_size.add_argument("--warmup", type=int, default=20)
+    p_size.add_argument("--transactions", type=int, default=0)
+    p_size.add_argument("--seed", type=int, default=42)
+    p_size.add_argument("--rounds", type=int, default=3)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    if args.command == "compare":
+        return compare(args)
+    result = run_size(args.drinks, args.iterations, args.warmup, args.transactions, args.seed, args.rounds)
+    with open(args.out, "w") as f:
+        json.dump(result, f)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Synthetic catalogs for benchmarks.
+
+build_catalog() returns a document in the /api/admin/catalog format, so it
+is loaded with Database.admin_import_catalog() — the same single-transaction
+path a real Pi is provisioned with. Everything is derived from `seed`, so a
+given (drinks, seed) pair always produces the same catalog.
+"""
+
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from db.models import sales
+
+
+def build_catalog(drinks: int, lines: int = 16, ingredients: int = 48, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    catalog = {
+        "categories":       [{"id": i + 1, "name": f"Category {i + 1}"} for i in range(4)],
+        "ui_groups":        [{"id": i + 1, "category_id": i % 4 + 1, "name": f"Group {i + 1}"} for i in range(12)],
+        "ingredient_types": [{"id": i + 1, "name": name} for i, name in enumerate(["Spirit", "Liqueur", "Mixer", "Syrup"])],
+        "ingredients":      [{"id": i + 1, "name": f"Ingredient {i + 1}", "type_id": i % 4 + 1, "enabled": 1}
+                             for i in range(ingredients)],
+        "glasses":          [{"id": i + 1, "name": name} for i, name in enumerate(["Highball", "Rocks", "Coupe"])],
+        "methods":          [{"id": i + 1, "name": name} for i, name in enumerate(["Build", "Shake", "Stir"])],
+        "lines":            [{"id": i + 1, "name": f"L{i}", "calibration_type": "none", "calibration_value": 0.0}
+                             for i in range(lines)],
+        "extras":           [{"id": i + 1, "name": f"Extra {i + 1}", "price": 0.5} for i in range(6)],
+        # Only the first `lines` ingredients are loaded; drinks using the rest show as out of stock.
+        # Bottles are effectively bottomless so long runs never drain them.
+        "bottles":          [{"id": i + 1, "ingredient_id": i + 1, "line_id": i + 1, "flow_rate": 25.0,
+                              "capacity_ml": 1e9, "current_ml": 1e9, "enabled": 1} for i in range(lines)],
+        "drinks":           [],
+        "recipes":          [],
+        "recipe_extras":    [],
+    }
+    loaded = list(range(1, lines + 1))
+    everything = list(range(1, ingredients + 1))
+    for n in range(drinks):
+        did = f"D{n:06d}"
+        group = rng.randrange(12) + 1
+        catalog["drinks"].append({
+            "id": did, "name": f"Drink {n}", "category_id": (group - 1) % 4 + 1, "ui_group_id": group,
+            "glass_id": rng.randrange(3) + 1, "method_id": rng.randrange(3) + 1,
+            "has_ice": rng.randrange(2), "price": round(rng.uniform(4, 14), 2), "enabled": 1,
+        })
+        # ~90% of drinks can be poured from the loaded lines
+        pool = loaded if rng.random() < 0.9 else everything
+        for ingredient_id in rng.sample(pool, rng.randint(2, 5)):
+            catalog["recipes"].append({"drink_id": did, "ingredient_id": ingredient_id,
+                                       "amount_ml": float(rng.choice([10, 15, 20, 30, 45, 60]))})
+        for extra_id in rng.sample(range(1, 7), rng.randint(0, 2)):
+            catalog["recipe_extras"].append({"drink_id": did, "extra_id": extra_id})
+    return catalog
+
+
+def seed_transactions(db_path: str, drink_ids: list[str], count: int, seed: int = 42):
+    """Backfill `count` historical transactions (one executemany, outside the app's pool)."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=90)
+    statuses = ["completed"] * 17 + ["failed", "error", "cancelled"]
+    rows = []
+    for i in range(count):
+        drink_id = rng.choice(drink_ids)
+        timestamp = (start + timedelta(seconds=i * 7776000 / max(count, 1))).isoformat()
+        rows.append((drink_id, rng.choice(statuses), timestamp, drink_id))
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(sales.INSERT_TRANSACTION, rows)
+    conn.close()
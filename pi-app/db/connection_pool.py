@@ -0,0 +1,120 @@
+"""
+db/connection_pool.py — SQLite connections for the Mixion Pi App
+=================================================================
+  - Every thread gets its own read-only connection, so WAL readers run in
+    parallel across the FastAPI threadpool.
+  - All writes go through ONE writer connection guarded by a re-entrant lock,
+    so statements from different threads never interleave in a transaction.
+  - Pools are shared per database file: every Database() in the process
+    reuses the same writer and the same per-thread readers.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from db.profiler import ProfilingCursor
+from services import metrics
+
+SYNCHRONOUS = "NORMAL"            # WAL + NORMAL: durable on app crash, one fsync per checkpoint
+WRITER_CACHE_KIB = 8192           # page cache of the writer connection
+READER_CACHE_KIB = 2048           # page cache of each per-thread reader
+MMAP_SIZE = 64 * 1024 * 1024      # shared OS page cache mapping, not per-connection RAM
+BUSY_TIMEOUT_MS = 5000
+
+
+class _Connection(sqlite3.Connection):
+    """Hands out profiling cursors (see db/profiler.py) and counts commits and rollbacks for /metrics."""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        super().commit()
+        metrics.DB_COMMITS.inc()
+
+    def rollback(self):
+        super().rollback()
+        metrics.DB_ROLLBACKS.inc()
+
+
+class ConnectionPool:
+    _pools: dict[str, "ConnectionPool"] = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, path: str) -> "ConnectionPool":
+        with cls._pools_lock:
+            pool = cls._pools.get(path)
+            if pool is None:
+                pool = cls(path)
+                cls._pools[path] = pool
+            return pool
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer = self._open(check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute(f"PRAGMA cache_size=-{WRITER_CACHE_KIB}")
+
+    def _open(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, factory=_Connection, **kwargs)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "reader", None)
+        if conn is None:
+            conn = self._open(isolation_level=None)
+            conn.execute(f"PRAGMA cache_size=-{READER_CACHE_KIB}")
+            conn.execute("PRAGMA query_only=ON")
+            self._local.reader = conn
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """The writer while this thread is inside writer(), otherwise its reader."""
+        if getattr(self._local, "write_depth", 0):
+            return self._writer
+        return self.reader()
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            depth = getattr(self._local, "write_depth", 0)
+            self._local.write_depth = depth + 1
+            try:
+                yield self._writer
+            except BaseException:
+                if depth == 0 and self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+            finally:
+                self._local.write_depth = depth
+                # Never leave a half-finished transaction on the shared writer
+                if depth == 0 and self._writer.in_transaction:
+                    self._writer.rollback()
+
+    @contextmanager
+    def snapshot(self):
+        """One consistent read transaction across several queries."""
+        if getattr(self._local, "write_depth", 0):
+            yield self._writer
+            return
+        conn = self.reader()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
@@ -1,16 +1,115 @@
 import sqlite3
 import os
+import json
+import functools
+import inspect
+import secrets
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
+from db.connection_pool import ConnectionPool
+from db.migrate import DB_PATH, MIGRATIONS
+from db.models import log, sales, session, sync_queue
+from db.profiler import profiler
+from services import metrics
+
+def _writes(method):
+    """Run a Database method on the shared writer connection, one writer at a time."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._pool.writer():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _timed(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler.enter_method(name)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.exit_method(name, elapsed)
+            metrics.DB_CALL_LATENCY.observe(elapsed, method=name)
+    return wrapper
+
+
+def _sync_configured() -> bool:
+    config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
+    try:
+        with open(config_path, "r") as f:
+            return bool(json.load(f).get("sync_url"))
+    except Exception as e:
+        print(f"⚠️ Could not load config.json: {e}")
+        return False
+
 
 class Database:
-    def __init__(self):
-        os.makedirs("data", exist_ok=True)
-        self.conn = sqlite3.connect("data/mixion.db", check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.conn.execute("PRAGMA journal_mode=WAL")
-        self.conn.execute("PRAGMA foreign_keys=ON")
-        self._init_schema()
+    _shared = None
+    _shared_lock = threading.Lock()
+    _schema_checked = False
+    _outbox_enabled = False
 
+    def __init__(self):
+        # The schema is checked once per process. When db/migrate.py has applied
+        # every migration (run.sh runs it before the app) there is nothing to do;
+        # otherwise (a fresh dev checkout, the benchmarks) create it here.
+        with Database._shared_lock:
+            if not Database._schema_checked:
+                os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+                self._pool = ConnectionPool.shared(DB_PATH)
+                if not self._schema_migrated():
+                    self._init_schema()
+                Database._outbox_enabled = _sync_configured()
+                Database._schema_checked = True
+        self._pool = ConnectionPool.shared(DB_PATH)
+        self._refresh_media_index()
+
+    @classmethod
+    def shared(cls) -> "Database":
+        """The process-wide handle that routes and services share."""
+        if cls._shared is None:
+            db = cls()
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = db
+        return cls._shared
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._pool.connection()
+
+    @contextmanager
+    def write(self, name: str):
+        """
+        The writer connection for code outside this class (the repositories),
+        one writer at a time like @_writes, timed as `name` for /metrics and
+        the query profiler.
+        """
+        profiler.enter_method(name)
+        start = time.perf_counter()
+        try:
+            with self._pool.writer():
+                yield self.conn
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.exit_method(name, elapsed)
+            metrics.DB_CALL_LATENCY.observe(elapsed, method=name)
+
+    def _schema_migrated(self) -> bool:
+        try:
+            row = self.conn.execute("SELECT MAX(version) FROM _schema_migrations").fetchone()
+        except sqlite3.OperationalError:
+            return False    # migrate.py never ran on this file
+        return row[0] is not None and row[0] >= MIGRATIONS[-1][0]
+
+    @_writes
     def _init_schema(self):
         c = self.conn.cursor()
         c.executescript("""
@@ -112,11 +211,42 @@ class Database:
                 drink_id  TEXT NOT NULL,
                 status    TEXT NOT NULL DEFAULT 'started',
                 timestamp TEXT NOT NULL,
+                price     REAL,
                 FOREIGN KEY(drink_id) REFERENCES drinks(id) ON DELETE CASCADE
             );
         """)
+        c.execute(sync_queue.CREATE_OUTBOX)
+        c.execute(sync_queue.CREATE_STATE)
+        c.execute(log.CREATE_ARCHIVE)
+        c.execute(session.CREATE_SESSIONS)
+        c.execute("PRAGMA table_info(transactions)")
+        if "price" not in {row[1] for row in c.fetchall()}:
+            c.execute(sales.ADD_PRICE)
+            c.execute(sales.FILL_PRICE)
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sales_rollup'")
+        backfill = c.fetchone() is None
+        c.execute(sales.CREATE_ROLLUP)
+        # The indexes are defined by the migrations (v5, v7, v8); create the same ones
+        for _, _, statements in MIGRATIONS:
+            for sql in statements:
+                if sql.lstrip().upper().startswith("CREATE INDEX"):
+                    c.execute(sql)
+        for trigger in sales.DROP_TRIGGERS + sales.TRIGGERS:
+            c.execute(trigger)
+        if backfill:
+            c.execute(sales.BACKFILL)
         self.conn.commit()
 
+    def _append_outbox(self, c, kind: str, payload: dict):
+        # Called inside the writing transaction so the sync record commits with the change.
+        # Without a sync_url nothing would ever drain the table, so don't fill it.
+        if not Database._outbox_enabled:
+            return
+        c.execute(
+            sync_queue.INSERT_OUTBOX,
+            (kind, uuid.uuid4().hex, json.dumps(payload), datetime.now().isoformat())
+        )
+
     # ── Core: Availability & Frontend ─────────────────────────────────────────
 
     def check_drink_availability(self, drink_id: str, device_online: bool = True) -> tuple[bool, str]:
@@ -138,18 +268,24 @@ class Database:
         """, (drink_id,))
         rows = c.fetchall()
 
+        reason = self._stock_problem(rows)
+        if reason:
+            return False, reason
+        return True, "ok"
+
+    @staticmethod
+    def _stock_problem(rows) -> str | None:
         if not rows:
-            return False, "No recipe defined"
+            return "No recipe defined"
 
         for row in rows:
             if not row["bottle_id"]:
-                return False, f"Missing bottle for {row['ingredient_name']}"
+                return f"Missing bottle for {row['ingredient_name']}"
             if not row["bottle_enabled"]:
-                return False, f"Bottle for {row['ingredient_name']} is disabled"
+                return f"Bottle for {row['ingredient_name']} is disabled"
             if row["current_ml"] < row["amount_ml"]:
-                return False, f"Low stock for {row['ingredient_name']} ({row['current_ml']:.0f}ml available, needs {row['amount_ml']}ml)"
-
-        return True, "ok"
+                return f"Low stock for {row['ingredient_name']} ({row['current_ml']:.0f}ml available, needs {row['amount_ml']}ml)"
+        return None
 
     # ── Media helper ────────────────────────────────────────────────────────
     _MEDIA_EXTS = [
@@ -171,16 +307,225 @@ class Database:
         ),
     ]
 
-    def _resolve_media(self, drink_id: str):
-        for base_dir, public_prefix in self._MEDIA_DIRS:
-            base = os.path.normpath(base_dir)
-            for ext, mtype in self._MEDIA_EXTS:
-                path = os.path.join(base, f"{drink_id}.{ext}")
-                if os.path.isfile(path):
-                    return f"{public_prefix}/{drink_id}.{ext}", mtype
-        return None, None
+    # drink_id -> (url, type), built from one directory listing per media dir.
+    # The directory mtimes are re-checked at most every _MEDIA_RESCAN_SEC so
+    # resolving media on the request path never probes individual files.
+    _MEDIA_RESCAN_SEC = 5.0
+    _media_lock = threading.Lock()
+    _media_index: dict | None = None
+    _media_mtimes: tuple = ()
+    _media_checked_at = 0.0
+
+    @classmethod
+    def _media_dir_mtimes(cls) -> tuple:
+        mtimes = []
+        for base_dir, _ in cls._MEDIA_DIRS:
+            try:
+                mtimes.append(os.stat(base_dir).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    @classmethod
+    def _scan_media(cls) -> dict:
+        ext_rank = {ext: (rank, mtype) for rank, (ext, mtype) in enumerate(cls._MEDIA_EXTS)}
+        index = {}
+        best = {}
+        for dir_rank, (base_dir, public_prefix) in enumerate(cls._MEDIA_DIRS):
+            try:
+                entries = os.scandir(os.path.normpath(base_dir))
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    stem, dot, ext = entry.name.rpartition(".")
+                    if not dot or ext not in ext_rank or not entry.is_file():
+                        continue
+                    rank = (dir_rank, ext_rank[ext][0])
+                    if stem not in best or rank < best[stem]:
+                        best[stem] = rank
+                        index[stem] = (f"{public_prefix}/{entry.name}", ext_rank[ext][1])
+        return index
+
+    def _refresh_media_index(self) -> bool:
+        """Rescan the media dirs if they changed. Returns True if the index changed."""
+        now = time.monotonic()
+        with Database._media_lock:
+            if Database._media_index is not None and now - Database._media_checked_at < self._MEDIA_RESCAN_SEC:
+                return False
+            Database._media_checked_at = now
+            mtimes = self._media_dir_mtimes()
+            if Database._media_index is not None and mtimes == Database._media_mtimes:
+                return False
+            index = self._scan_media()
+            changed = Database._media_index is not None and index != Database._media_index
+            Database._media_index = index
+            Database._media_mtimes = mtimes
+            return changed
 
-    def get_all_drinks(self, device_online: bool = True):
+    def _resolve_media(self, drink_id: str):
+        if Database._media_index is None:
+            self._refresh_media_index()
+        return Database._media_index.get(drink_id, (None, None))
+
+    # ── Menu snapshot ───────────────────────────────────────────────────────
+    # Shared by every Database instance in the process. Writers bump the
+    # generation; deduct/refill only mark their bottles dirty so the next read
+    # re-evaluates availability for the drinks using them instead of re-running
+    # the full menu join.
+    _menu_lock = threading.RLock()
+    _menu_epoch = secrets.token_hex(4)
+    _menu_generation = 0
+    _menu_state = None
+    _menu_dirty_bottles: set = set()
+    _menu_json: dict = {}
+    _change_listeners: list = []    # (callback, relay)
+
+    @classmethod
+    def add_change_listener(cls, callback, relay: bool = False):
+        """
+        callback(event: str, data: dict) — "menu", "inventory" or "pour_plans" after each invalidation.
+        relay=True marks a listener that forwards changes to other processes; it
+        only hears changes committed here, never ones from apply_remote_change.
+        """
+        if all(cb != callback for cb, _ in cls._change_listeners):
+            cls._change_listeners.append((callback, relay))
+
+    @classmethod
+    def _notify_change(cls, event: str, data: dict, remote: bool = False):
+        for callback, relay in cls._change_listeners:
+            if remote and relay:
+                continue
+            try:
+                callback(event, data)
+            except Exception:
+                pass
+
+    @property
+    def menu_generation(self) -> int:
+        return Database._menu_generation
+
+    @property
+    def menu_epoch(self) -> str:
+        # Changes on every process start so generations never collide across restarts
+        return Database._menu_epoch
+
+    @classmethod
+    def _reset_menu(cls) -> int:
+        with cls._menu_lock:
+            cls._menu_generation += 1
+            cls._menu_state = None
+            cls._menu_dirty_bottles = set()
+            cls._menu_json = {}
+            return cls._menu_generation
+
+    @classmethod
+    def _mark_bottles(cls, bottle_ids: set) -> int:
+        with cls._menu_lock:
+            cls._menu_generation += 1
+            if cls._menu_state is not None:
+                cls._menu_dirty_bottles.update(bottle_ids)
+            cls._menu_json = {}
+            return cls._menu_generation
+
+    def _invalidate_menu(self):
+        self._notify_change("menu", {"generation": Database._reset_menu()})
+
+    def _invalidate_bottles(self, bottle_ids):
+        bottle_ids = set(bottle_ids)
+        generation = Database._mark_bottles(bottle_ids)
+        self._notify_change("inventory", {"generation": generation, "bottles": sorted(bottle_ids)})
+
+    @classmethod
+    def apply_remote_change(cls, event: str, data: dict) -> int | None:
+        """
+        Apply a change committed by another process (multi-process mode) to this
+        process's caches and tell the local change listeners, except relays, so
+        it is never sent back. Returns the new local menu generation, or None
+        for pour-plan events.
+        """
+        generation = None
+        if event == "menu":
+            generation = cls._reset_menu()
+        elif event == "inventory":
+            generation = cls._mark_bottles(set(data.get("bottles") or ()))
+        elif event == "pour_plans":
+            drinks = data.get("drinks")
+            cls._notify_plans(None if drinks is None else set(drinks))
+        else:
+            return None
+        if generation is not None:
+            # Listeners compare against this process's generation, not the sender's
+            data = dict(data, generation=generation)
+        cls._notify_change(event, data, remote=True)
+        return generation
+
+    # ── Pour plans ──────────────────────────────────────────────────────────
+    # PourService caches a compiled plan per drink. Mutators that change what a
+    # drink pours (recipes, bottles, lines, ingredient names, drink enabled)
+    # report exactly which drinks are affected; None means all of them.
+    _plan_listeners: list = []
+
+    @classmethod
+    def add_pour_plan_listener(cls, callback):
+        """callback(drink_ids: set | None) after a change that makes cached pour plans stale."""
+        if callback not in cls._plan_listeners:
+            cls._plan_listeners.append(callback)
+
+    def _invalidate_pour_plans(self, drink_ids):
+        drink_ids = None if drink_ids is None else set(drink_ids)
+        if drink_ids is not None and not drink_ids:
+            return
+        Database._notify_plans(drink_ids)
+        # Also a change event, so multi-process mode can relay it to the hardware daemon
+        self._notify_change("pour_plans", {"drinks": sorted(drink_ids) if drink_ids is not None else None})
+
+    @classmethod
+    def _notify_plans(cls, drink_ids):
+        for callback in cls._plan_listeners:
+            try:
+                callback(drink_ids)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _drinks_using(c, ingredient_ids=(), bottle_ids=(), line_ids=()) -> set:
+        """Drinks whose recipes draw on any of these ingredients, bottles or lines."""
+        ingredient_ids = {i for i in ingredient_ids if i is not None}
+        for column, ids in (("id", bottle_ids), ("line_id", line_ids)):
+            ids = [i for i in ids if i is not None]
+            if ids:
+                c.execute(
+                    f"SELECT ingredient_id FROM bottles WHERE {column} IN ({','.join('?' * len(ids))})", ids
+                )
+                ingredient_ids.update(r[0] for r in c.fetchall() if r[0] is not None)
+        if not ingredient_ids:
+            return set()
+        ids = list(ingredient_ids)
+        c.execute(f"SELECT DISTINCT drink_id FROM recipes WHERE ingredient_id IN ({','.join('?' * len(ids))})", ids)
+        return {r[0] for r in c.fetchall()}
+
+    @staticmethod
+    def _apply_availability(drink: dict, requirements: list, bottles: dict):
+        drink["available"] = True
+        drink["unavailable_reason"] = None
+        for ing_name, amount_ml, bottle_id in requirements:
+            if not bottle_id:
+                drink["available"] = False
+                drink["unavailable_reason"] = f"No bottle for {ing_name}"
+                continue
+            current_ml, bottle_enabled = bottles[bottle_id]
+            if not bottle_enabled:
+                drink["available"] = False
+                drink["unavailable_reason"] = f"Bottle for {ing_name} disabled"
+            elif current_ml < amount_ml:
+                drink["available"] = False
+                drink["unavailable_reason"] = f"Low stock for {ing_name}"
+        if not drink["ingredients"]:
+            drink["available"] = False
+            drink["unavailable_reason"] = "No recipe set"
+
+    def _build_menu_state(self) -> dict:
         c = self.conn.cursor()
         c.execute("""
             SELECT d.id, d.name, d.price, d.enabled, d.has_ice,
@@ -202,6 +547,9 @@ class Database:
         rows = c.fetchall()
 
         drinks_map = {}
+        requirements = {}
+        bottles = {}
+        bottle_drinks = {}
         for row in rows:
             did = row["id"]
             if did not in drinks_map:
@@ -223,20 +571,17 @@ class Database:
                     "media": media_url,
                     "media_type": media_type,
                 }
+                requirements[did] = []
             if row["ing_name"]:
                 drinks_map[did]["ingredients"].append({
                     "name": row["ing_name"],
                     "amount_ml": row["amount_ml"]
                 })
-                if not row["bottle_id"]:
-                    drinks_map[did]["available"] = False
-                    drinks_map[did]["unavailable_reason"] = f"No bottle for {row['ing_name']}"
-                elif not row["bottle_enabled"]:
-                    drinks_map[did]["available"] = False
-                    drinks_map[did]["unavailable_reason"] = f"Bottle for {row['ing_name']} disabled"
-                elif row["current_ml"] < row["amount_ml"]:
-                    drinks_map[did]["available"] = False
-                    drinks_map[did]["unavailable_reason"] = f"Low stock for {row['ing_name']}"
+                bid = row["bottle_id"]
+                requirements[did].append((row["ing_name"], row["amount_ml"], bid))
+                if bid:
+                    bottles[bid] = (row["current_ml"], row["bottle_enabled"])
+                    bottle_drinks.setdefault(bid, set()).add(did)
 
         # Fetch extras for the menu
         c.execute("""
@@ -253,16 +598,64 @@ class Database:
                     "price": row["price"]
                 })
 
-        result = list(drinks_map.values())
-        for d in result:
-            if not device_online:
-                d["available"] = False
-                d["unavailable_reason"] = "Hardware Offline"
-            elif not d["ingredients"]:
-                d["available"] = False
-                d["unavailable_reason"] = "No recipe set"
+        for did, drink in drinks_map.items():
+            self._apply_availability(drink, requirements[did], bottles)
 
-        return result
+        return {
+            "drinks": drinks_map,
+            "requirements": requirements,
+            "bottles": bottles,
+            "bottle_drinks": bottle_drinks,
+        }
+
+    def _refresh_dirty_bottles(self, state: dict, bottle_ids: set):
+        ids = [bid for bid in bottle_ids if bid in state["bottles"]]
+        if not ids:
+            return
+        c = self.conn.cursor()
+        c.execute(
+            f"SELECT id, current_ml, enabled FROM bottles WHERE id IN ({','.join('?' * len(ids))})",
+            ids
+        )
+        for row in c.fetchall():
+            state["bottles"][row["id"]] = (row["current_ml"], row["enabled"])
+
+        affected = set()
+        for bid in ids:
+            affected |= state["bottle_drinks"].get(bid, set())
+        for did in affected:
+            self._apply_availability(state["drinks"][did], state["requirements"][did], state["bottles"])
+
+    def get_menu_json(self, device_online: bool = True) -> bytes:
+        return self.get_menu_snapshot(device_online)[1]
+
+    def get_menu_snapshot(self, device_online: bool = True) -> tuple[int, bytes]:
+        if self._refresh_media_index():
+            self._invalidate_menu()
+        with Database._menu_lock:
+            state = Database._menu_state
+            if state is None:
+                state = self._build_menu_state()
+                Database._menu_state = state
+                Database._menu_dirty_bottles = set()
+            elif Database._menu_dirty_bottles:
+                self._refresh_dirty_bottles(state, Database._menu_dirty_bottles)
+                Database._menu_dirty_bottles = set()
+
+            payload = Database._menu_json.get(device_online)
+            if payload is None:
+                drinks = list(state["drinks"].values())
+                if not device_online:
+                    drinks = [
+                        dict(d, available=False, unavailable_reason="Hardware Offline")
+                        for d in drinks
+                    ]
+                payload = json.dumps(drinks).encode("utf-8")
+                Database._menu_json[device_online] = payload
+            return Database._menu_generation, payload
+
+    def get_all_drinks(self, device_online: bool = True):
+        return json.loads(self.get_menu_json(device_online))
 
     def get_recipe_bottles(self, drink_id: str):
         c = self.conn.cursor()
@@ -276,22 +669,123 @@ class Database:
         """, (drink_id,))
         return [dict(r) for r in c.fetchall()]
 
+    def get_pour_plan_rows(self, drink_id: str):
+        """
+        Everything a pour plan is compiled from, in one query. No rows means the
+        drink does not exist; one row with amount_ml NULL means it has no recipe.
+        """
+        c = self.conn.cursor()
+        c.execute("""
+            SELECT d.enabled as drink_enabled, r.amount_ml, i.name as ingredient_name,
+                   b.id as bottle_id, b.flow_rate, b.enabled as bottle_enabled,
+                   l.name as line_name, l.calibration_type, l.calibration_value
+            FROM drinks d
+            LEFT JOIN recipes r ON r.drink_id = d.id
+            LEFT JOIN ingredients i ON i.id = r.ingredient_id
+            LEFT JOIN bottles b ON b.ingredient_id = r.ingredient_id
+            LEFT JOIN lines l ON b.line_id = l.id
+            WHERE d.id = ?
+            ORDER BY r.id
+        """, (drink_id,))
+        return [dict(r) for r in c.fetchall()]
+
     # ── Transactions ─────────────────────────────────────────────────────────
 
-    def create_transaction(self, drink_id: str) -> int:
+    @_writes
+    def reserve_plan(self, drink_id: str, bottles, status: str = "completed") -> tuple[bool, str, int | None]:
+        """
+        Reserve stock for a precompiled pour plan and record the transaction in
+        one BEGIN IMMEDIATE transaction (a single commit). Bottles ({"id",
+        "name", "amount_ml"}) come from the caller, so only the conditional
+        stock UPDATEs and the transaction INSERT run. Returns (ok, reason, txn_id).
+        """
         c = self.conn.cursor()
-        c.execute(
-            "INSERT INTO transactions (drink_id, status, timestamp) VALUES (?,?,?)",
-            (drink_id, "started", datetime.now().isoformat())
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            reason, txn_id = self._take_stock(c, drink_id, bottles, status)
+            if reason:
+                self.conn.rollback()
+                return False, reason, None
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self._invalidate_bottles(b["id"] for b in bottles)
+        return True, "ok", txn_id
+
+    def _take_stock(self, c, drink_id: str, bottles, status: str) -> tuple[str | None, int | None]:
+        # Inside the caller's BEGIN IMMEDIATE. Each deduction is conditional, so
+        # concurrent orders can never take a bottle below zero.
+        for b in bottles:
+            c.execute(
+                "UPDATE bottles SET current_ml = current_ml - ? WHERE id=? AND enabled=1 AND current_ml >= ?",
+                (b["amount_ml"], b["id"], b["amount_ml"])
+            )
+            if c.rowcount != 1:
+                c.execute("SELECT current_ml, enabled FROM bottles WHERE id=?", (b["id"],))
+                row = c.fetchone()
+                if row is None:
+                    return f"Missing bottle for {b['name']}", None
+                if not row["enabled"]:
+                    return f"Bottle for {b['name']} is disabled", None
+                return f"Low stock for {b['name']} ({row['current_ml']:.0f}ml available, needs {b['amount_ml']}ml)", None
+
+        timestamp = datetime.now().isoformat()
+        c.execute(sales.INSERT_TRANSACTION, (drink_id, status, timestamp, drink_id))
+        txn_id = c.lastrowid
+        self._append_outbox(c, sync_queue.KIND_TRANSACTION, {
+            "transaction_id": txn_id, "drink_id": drink_id, "status": status, "timestamp": timestamp,
+            "bottles": [{"bottle_id": b["id"], "delta_ml": -b["amount_ml"]} for b in bottles],
+        })
+        return None, txn_id
+
+    @_writes
+    def release_reservation(self, txn_id: int, bottles: list, status: str = "failed"):
+        """Give back stock taken by reserve_plan for a pour that never started."""
+        c = self.conn.cursor()
+        c.executemany(
+            "UPDATE bottles SET current_ml = current_ml + ? WHERE id=?",
+            [(b["amount_ml"], b["id"]) for b in bottles]
         )
+        c.execute("UPDATE transactions SET status=? WHERE id=?", (status, txn_id))
+        self._append_outbox(c, sync_queue.KIND_TRANSACTION, {
+            "transaction_id": txn_id, "status": status, "timestamp": datetime.now().isoformat(),
+            "bottles": [{"bottle_id": b["id"], "delta_ml": b["amount_ml"]} for b in bottles],
+        })
         self.conn.commit()
-        return c.lastrowid
+        self._invalidate_bottles(b["id"] for b in bottles)
 
+    @_writes
     def complete_transaction(self, txn_id: int, status: str = "completed"):
         c = self.conn.cursor()
         c.execute("UPDATE transactions SET status=? WHERE id=?", (status, txn_id))
+        self._append_outbox(c, sync_queue.KIND_TRANSACTION, {
+            "transaction_id": txn_id, "status": status, "timestamp": datetime.now().isoformat(),
+        })
+        self.conn.commit()
+
+    @_writes
+    def close_stale_transactions(self, status: str = "error") -> int:
+        """
+        Settle transactions still 'started' when the dispenser's owner starts up:
+        their CMDs died with the previous process. Whether anything was poured is
+        unknown, so the reserved stock stays deducted. Returns how many were closed.
+        """
+        c = self.conn.cursor()
+        c.execute("SELECT id FROM transactions WHERE status='started'")
+        txn_ids = [row["id"] for row in c.fetchall()]
+        if not txn_ids:
+            return 0
+        timestamp = datetime.now().isoformat()
+        c.executemany("UPDATE transactions SET status=? WHERE id=?", [(status, txn_id) for txn_id in txn_ids])
+        for txn_id in txn_ids:
+            self._append_outbox(c, sync_queue.KIND_TRANSACTION, {
+                "transaction_id": txn_id, "status": status, "timestamp": timestamp,
+            })
         self.conn.commit()
+        return len(txn_ids)
 
+    @_writes
     def deduct_bottles(self, drink_id: str):
         c = self.conn.cursor()
         c.execute("""
@@ -306,259 +800,388 @@ class Database:
                 "UPDATE bottles SET current_ml = MAX(0, current_ml - ?) WHERE id=?",
                 (row["amount_ml"], row["bottle_id"])
             )
+            self._append_outbox(c, sync_queue.KIND_INVENTORY, {
+                "bottle_id": row["bottle_id"], "delta_ml": -row["amount_ml"], "reason": "pour",
+            })
         self.conn.commit()
+        self._invalidate_bottles(row["bottle_id"] for row in rows)
+
+    # ── Admin: Lookup lists ──────────────────────────────────────────────────
+    # The lists the admin console edits, by route name. Each query is wrapped
+    # as a subquery so fields= projects on it and pages walk it by id (keyset,
+    # ascending); GET /admin/bootstrap reads all of them in one transaction.
+    ADMIN_LISTS = {
+        "categories": "SELECT * FROM categories",
+        "groups": """
+            SELECT g.*, c.name as category_name
+            FROM ui_groups g
+            JOIN categories c ON g.category_id = c.id
+        """,
+        "ingredient_types": "SELECT * FROM ingredient_types",
+        "glasses": "SELECT * FROM glasses",
+        "methods": "SELECT * FROM methods",
+        "extras": "SELECT * FROM extras",
+        "ingredients": """
+            SELECT i.*, t.name as type_name
+            FROM ingredients i
+            JOIN ingredient_types t ON i.type_id = t.id
+        """,
+        "lines": "SELECT * FROM lines",
+        "bottles": """
+            SELECT b.*, i.name as ingredient_name, l.name as line_name
+            FROM bottles b
+            LEFT JOIN ingredients i ON b.ingredient_id = i.id
+            JOIN lines l ON b.line_id = l.id
+        """,
+        "drinks": """
+            SELECT d.*, cat.name as category_name, grp.name as group_name,
+                   gl.name as glass_name, meth.name as method_name
+            FROM drinks d
+            JOIN categories cat ON d.category_id = cat.id
+            JOIN ui_groups grp ON d.ui_group_id = grp.id
+            JOIN glasses gl ON d.glass_id = gl.id
+            JOIN methods meth ON d.method_id = meth.id
+        """,
+    }
+    _admin_list_columns: dict = {}
+
+    def _admin_list_query(self, conn, name: str, fields=None, limit=None, cursor=None) -> tuple[str, list]:
+        base = self.ADMIN_LISTS[name]
+        columns = Database._admin_list_columns.get(name)
+        if columns is None:
+            columns = [d[0] for d in conn.execute(f"SELECT * FROM ({base}) LIMIT 0").description]
+            Database._admin_list_columns[name] = columns
+        if fields:
+            unknown = [f for f in fields if f not in columns]
+            if unknown:
+                raise ValueError(f"Unknown field(s) for {name}: {', '.join(unknown)}")
+            # The id is always included: it is the key, and the cursor of the next page
+            select = ", ".join(["id"] + [f for f in dict.fromkeys(fields) if f != "id"])
+        else:
+            select = "*"
+        sql, params = f"SELECT {select} FROM ({base})", []
+        if cursor is not None:
+            sql += " WHERE id > ?"
+            params.append(cursor)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return sql, params
+
+    def admin_list(self, name: str, fields: list[str] | None = None, limit: int | None = None,
+                   cursor: str | int | None = None) -> list[dict]:
+        """
+        One lookup list. fields limits the columns (id is always included);
+        with limit, pass the last id of the previous page as cursor.
+        Raises ValueError for an unknown field.
+        """
+        conn = self.conn
+        sql, params = self._admin_list_query(conn, name, fields, limit, cursor)
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+    def admin_bootstrap(self) -> dict:
+        """Every lookup list the admin console needs, from one read transaction."""
+        # Taken before the read: a change racing it leaves an older stamp, never a newer one
+        result = {"version": f"{self.menu_epoch}-{self.menu_generation}"}
+        with self._pool.snapshot() as conn:
+            for name in self.ADMIN_LISTS:
+                sql, params = self._admin_list_query(conn, name)
+                result[name] = [dict(r) for r in conn.execute(sql, params).fetchall()]
+        return result
 
     # ── Admin: Categories & Groups ───────────────────────────────────────────
 
     def admin_get_categories(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM categories")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("categories")
 
+    @_writes
     def admin_add_category(self, name):
         c = self.conn.cursor()
         c.execute("INSERT INTO categories (name) VALUES (?)", (name,))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_category(self, cid, name):
         c = self.conn.cursor()
         c.execute("UPDATE categories SET name=? WHERE id=?", (name, cid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_category(self, cid):
         c = self.conn.cursor()
         c.execute("DELETE FROM categories WHERE id=?", (cid,))
         c.execute("DELETE FROM ui_groups WHERE category_id=?", (cid,))
         self.conn.commit()
+        self._invalidate_menu()
 
     def admin_get_groups(self):
-        c = self.conn.cursor()
-        c.execute("""
-            SELECT g.*, c.name as category_name
-            FROM ui_groups g
-            JOIN categories c ON g.category_id = c.id
-        """)
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("groups")
 
+    @_writes
     def admin_add_group(self, category_id, name):
         c = self.conn.cursor()
         c.execute("INSERT INTO ui_groups (category_id, name) VALUES (?,?)", (category_id, name))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_group(self, gid, category_id, name):
         c = self.conn.cursor()
         c.execute("UPDATE ui_groups SET category_id=?, name=? WHERE id=?", (category_id, name, gid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_group(self, gid):
         c = self.conn.cursor()
         c.execute("DELETE FROM ui_groups WHERE id=?", (gid,))
         self.conn.commit()
+        self._invalidate_menu()
 
     # ── Admin: Ingredient Types ──────────────────────────────────────────────
 
     def admin_get_ingredient_types(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM ingredient_types")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("ingredient_types")
 
+    @_writes
     def admin_add_ingredient_type(self, name):
         c = self.conn.cursor()
         c.execute("INSERT INTO ingredient_types (name) VALUES (?)", (name,))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_ingredient_type(self, tid, name):
         c = self.conn.cursor()
         c.execute("UPDATE ingredient_types SET name=? WHERE id=?", (name, tid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_ingredient_type(self, tid):
         c = self.conn.cursor()
+        c.execute("SELECT id FROM ingredients WHERE type_id=?", (tid,))
+        drinks = self._drinks_using(c, ingredient_ids=[r["id"] for r in c.fetchall()])
         c.execute("DELETE FROM ingredient_types WHERE id=?", (tid,))
         c.execute("DELETE FROM ingredients WHERE type_id=?", (tid,))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
     # ── Admin: Glasses ───────────────────────────────────────────────────────
 
     def admin_get_glasses(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM glasses")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("glasses")
 
+    @_writes
     def admin_add_glass(self, name):
         c = self.conn.cursor()
         c.execute("INSERT INTO glasses (name) VALUES (?)", (name,))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_glass(self, gid, name):
         c = self.conn.cursor()
         c.execute("UPDATE glasses SET name=? WHERE id=?", (name, gid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_glass(self, gid):
         c = self.conn.cursor()
         c.execute("DELETE FROM glasses WHERE id=?", (gid,))
         self.conn.commit()
+        self._invalidate_menu()
 
     # ── Admin: Methods ───────────────────────────────────────────────────────
 
     def admin_get_methods(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM methods")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("methods")
 
+    @_writes
     def admin_add_method(self, name):
         c = self.conn.cursor()
         c.execute("INSERT INTO methods (name) VALUES (?)", (name,))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_method(self, mid, name):
         c = self.conn.cursor()
         c.execute("UPDATE methods SET name=? WHERE id=?", (name, mid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_method(self, mid):
         c = self.conn.cursor()
         c.execute("DELETE FROM methods WHERE id=?", (mid,))
         self.conn.commit()
+        self._invalidate_menu()
 
     # ── Admin: Extras ────────────────────────────────────────────────────────
 
     def admin_get_extras(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM extras")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("extras")
 
+    @_writes
     def admin_add_extra(self, name, price=0.0):
         c = self.conn.cursor()
         c.execute("INSERT INTO extras (name, price) VALUES (?, ?)", (name, price))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_extra(self, eid, name, price=0.0):
         c = self.conn.cursor()
         c.execute("UPDATE extras SET name=?, price=? WHERE id=?", (name, price, eid))
         self.conn.commit()
+        self._invalidate_menu()
 
+    @_writes
     def admin_delete_extra(self, eid):
         c = self.conn.cursor()
         c.execute("DELETE FROM extras WHERE id=?", (eid,))
         c.execute("DELETE FROM recipe_extras WHERE extra_id=?", (eid,))
         self.conn.commit()
+        self._invalidate_menu()
 
     # ── Admin: Ingredients ───────────────────────────────────────────────────
 
     def admin_get_ingredients(self):
-        c = self.conn.cursor()
-        c.execute("""
-            SELECT i.*, t.name as type_name
-            FROM ingredients i
-            JOIN ingredient_types t ON i.type_id = t.id
-        """)
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("ingredients")
 
+    @_writes
     def admin_add_ingredient(self, name, type_id, enabled):
         c = self.conn.cursor()
         c.execute("INSERT INTO ingredients (name, type_id, enabled) VALUES (?,?,?)", (name, type_id, enabled))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_ingredient(self, iid, name, type_id, enabled):
         c = self.conn.cursor()
         c.execute("UPDATE ingredients SET name=?, type_id=?, enabled=? WHERE id=?", (name, type_id, enabled, iid))
+        drinks = self._drinks_using(c, ingredient_ids=[iid])
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
+    @_writes
     def admin_delete_ingredient(self, iid):
         c = self.conn.cursor()
+        drinks = self._drinks_using(c, ingredient_ids=[iid])
         c.execute("DELETE FROM ingredients WHERE id=?", (iid,))
         c.execute("UPDATE bottles SET ingredient_id=NULL WHERE ingredient_id=?", (iid,))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
     # ── Admin: Lines ─────────────────────────────────────────────────────────
 
     def admin_get_lines(self):
-        c = self.conn.cursor()
-        c.execute("SELECT * FROM lines")
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("lines")
 
+    @_writes
     def admin_add_line(self, name, calibration_type='none', calibration_value=0.0):
         c = self.conn.cursor()
         c.execute("INSERT INTO lines (name, calibration_type, calibration_value) VALUES (?,?,?)", (name, calibration_type, calibration_value))
         self.conn.commit()
+        self._invalidate_menu()
         return c.lastrowid
 
+    @_writes
     def admin_update_line(self, lid, name, calibration_type='none', calibration_value=0.0):
         c = self.conn.cursor()
         c.execute("UPDATE lines SET name=?, calibration_type=?, calibration_value=? WHERE id=?", (name, calibration_type, calibration_value, lid))
+        drinks = self._drinks_using(c, line_ids=[lid])
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
+    @_writes
     def admin_delete_line(self, lid):
         c = self.conn.cursor()
+        drinks = self._drinks_using(c, line_ids=[lid])
         c.execute("DELETE FROM lines WHERE id=?", (lid,))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
     # ── Admin: Bottles ───────────────────────────────────────────────────────
 
     def admin_get_bottles(self):
-        c = self.conn.cursor()
-        c.execute("""
-            SELECT b.*, i.name as ingredient_name, l.name as line_name
-            FROM bottles b
-            LEFT JOIN ingredients i ON b.ingredient_id = i.id
-            JOIN lines l ON b.line_id = l.id
-        """)
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("bottles")
 
+    @_writes
     def admin_add_bottle(self, ingredient_id, line_id, flow_rate, capacity_ml, current_ml, enabled):
         c = self.conn.cursor()
         c.execute("""
             INSERT INTO bottles (ingredient_id, line_id, flow_rate, capacity_ml, current_ml, enabled)
             VALUES (?,?,?,?,?,?)
         """, (ingredient_id, line_id, flow_rate, capacity_ml, current_ml, enabled))
+        bid = c.lastrowid
+        drinks = self._drinks_using(c, ingredient_ids=[ingredient_id])
         self.conn.commit()
-        return c.lastrowid
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
+        return bid
 
+    @_writes
     def admin_update_bottle(self, bid, ingredient_id, line_id, flow_rate, capacity_ml, current_ml, enabled):
         c = self.conn.cursor()
+        # Drinks on the bottle's old ingredient and on its new one
+        drinks = self._drinks_using(c, ingredient_ids=[ingredient_id], bottle_ids=[bid])
         c.execute("""
             UPDATE bottles SET ingredient_id=?, line_id=?, flow_rate=?, capacity_ml=?, current_ml=?, enabled=?
             WHERE id=?
         """, (ingredient_id, line_id, flow_rate, capacity_ml, current_ml, enabled, bid))
+        self._append_outbox(c, sync_queue.KIND_INVENTORY, {
+            "bottle_id": bid, "current_ml": current_ml, "capacity_ml": capacity_ml, "reason": "update",
+        })
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
+    @_writes
     def admin_delete_bottle(self, bid):
         c = self.conn.cursor()
+        drinks = self._drinks_using(c, bottle_ids=[bid])
         c.execute("DELETE FROM bottles WHERE id=?", (bid,))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans(drinks)
 
+    @_writes
     def admin_refill_bottle(self, bid: int, fill_to_ml: float):
         c = self.conn.cursor()
         c.execute("SELECT current_ml FROM bottles WHERE id=?", (bid,))
         row = c.fetchone()
         if row:
             c.execute("UPDATE bottles SET current_ml = ? WHERE id=?", (fill_to_ml, bid))
+            self._append_outbox(c, sync_queue.KIND_INVENTORY, {
+                "bottle_id": bid, "current_ml": fill_to_ml, "reason": "refill",
+            })
             self.conn.commit()
+            self._invalidate_bottles([bid])
 
     # ── Admin: Drinks ────────────────────────────────────────────────────────
 
     def admin_get_drinks(self):
-        c = self.conn.cursor()
-        c.execute("""
-            SELECT d.*, cat.name as category_name, grp.name as group_name,
-                   gl.name as glass_name, meth.name as method_name
-            FROM drinks d
-            JOIN categories cat ON d.category_id = cat.id
-            JOIN ui_groups grp ON d.ui_group_id = grp.id
-            JOIN glasses gl ON d.glass_id = gl.id
-            JOIN methods meth ON d.method_id = meth.id
-        """)
-        return [dict(r) for r in c.fetchall()]
+        return self.admin_list("drinks")
 
+    @_writes
     def admin_add_drink(self, did, name, category_id, ui_group_id, glass_id, method_id, has_ice, price, enabled):
         c = self.conn.cursor()
         c.execute("""
@@ -566,21 +1189,29 @@ class Database:
             VALUES (?,?,?,?,?,?,?,?,?)
         """, (did, name, category_id, ui_group_id, glass_id, method_id, has_ice, price, enabled))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans([did])
         return did
 
+    @_writes
     def admin_update_drink(self, did, name, category_id, ui_group_id, glass_id, method_id, has_ice, price, enabled):
         c = self.conn.cursor()
         c.execute("""
             UPDATE drinks SET name=?, category_id=?, ui_group_id=?, glass_id=?, method_id=?, has_ice=?, price=?, enabled=? WHERE id=?
         """, (name, category_id, ui_group_id, glass_id, method_id, has_ice, price, enabled, did))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans([did])
 
+    @_writes
     def admin_delete_drink(self, did):
         c = self.conn.cursor()
         c.execute("DELETE FROM drinks WHERE id=?", (did,))
         c.execute("DELETE FROM recipes WHERE drink_id=?", (did,))
         c.execute("DELETE FROM recipe_extras WHERE drink_id=?", (did,))
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans([did])
 
     # ── Admin: Recipes ───────────────────────────────────────────────────────
 
@@ -605,33 +1236,298 @@ class Database:
         
         return {"ingredients": ingredients, "extras": extras}
 
+    @_writes
     def admin_set_recipes_for_drink(self, drink_id: str, data: dict):
         c = self.conn.cursor()
         c.execute("DELETE FROM recipes WHERE drink_id=?", (drink_id,))
         c.execute("DELETE FROM recipe_extras WHERE drink_id=?", (drink_id,))
         
-        for ing in data.get("ingredients", []):
-            c.execute(
-                "INSERT INTO recipes (drink_id, ingredient_id, amount_ml) VALUES (?,?,?)",
-                (drink_id, ing["ingredient_id"], ing["amount_ml"])
-            )
-            
-        for ext in data.get("extras", []):
-            c.execute(
-                "INSERT INTO recipe_extras (drink_id, extra_id) VALUES (?,?)",
-                (drink_id, ext["extra_id"])
-            )
-            
+        c.executemany(
+            "INSERT INTO recipes (drink_id, ingredient_id, amount_ml) VALUES (?,?,?)",
+            [(drink_id, ing["ingredient_id"], ing["amount_ml"]) for ing in data.get("ingredients", [])]
+        )
+        c.executemany(
+            "INSERT INTO recipe_extras (drink_id, extra_id) VALUES (?,?)",
+            [(drink_id, ext["extra_id"]) for ext in data.get("extras", [])]
+        )
+
         self.conn.commit()
+        self._invalidate_menu()
+        self._invalidate_pour_plans([drink_id])
+
+    # ── Admin: Catalog import/export ─────────────────────────────────────────
+    # table -> (columns, defaults for optional columns), in foreign-key order
+    CATALOG_TABLES = {
+        "categories":       (["id", "name"], {}),
+        "ui_groups":        (["id", "category_id", "name"], {}),
+        "ingredient_types": (["id", "name"], {}),
+        "ingredients":      (["id", "name", "type_id", "enabled"], {"enabled": 1}),
+        "glasses":          (["id", "name"], {}),
+        "methods":          (["id", "name"], {}),
+        "lines":            (["id", "name", "calibration_type", "calibration_value"],
+                             {"calibration_type": "none", "calibration_value": 0.0}),
+        "extras":           (["id", "name", "price"], {"price": 0.0}),
+        "bottles":          (["id", "ingredient_id", "line_id", "flow_rate", "capacity_ml", "current_ml", "enabled"],
+                             {"ingredient_id": None, "flow_rate": 5.0, "capacity_ml": 1000, "current_ml": None, "enabled": 1}),
+        "drinks":           (["id", "name", "category_id", "ui_group_id", "glass_id", "method_id", "has_ice", "price", "enabled"],
+                             {"has_ice": 1, "price": 0.0, "enabled": 1}),
+    }
+    # Recipes are replaced per drink rather than upserted by id
+    CATALOG_LINKS = {
+        "recipes":       ["drink_id", "ingredient_id", "amount_ml"],
+        "recipe_extras": ["drink_id", "extra_id"],
+    }
+    CATALOG_REFS = {
+        "ui_groups":     {"category_id": "categories"},
+        "ingredients":   {"type_id": "ingredient_types"},
+        "bottles":       {"ingredient_id": "ingredients", "line_id": "lines"},
+        "drinks":        {"category_id": "categories", "ui_group_id": "ui_groups",
+                          "glass_id": "glasses", "method_id": "methods"},
+        "recipes":       {"drink_id": "drinks", "ingredient_id": "ingredients"},
+        "recipe_extras": {"drink_id": "drinks", "extra_id": "extras"},
+    }
+    CATALOG_UNIQUE_NAMES = ("categories", "ingredient_types", "glasses", "methods", "lines", "extras")
+
+    def admin_export_catalog(self) -> dict:
+        """The whole catalog, read in one transaction so the sections agree."""
+        catalog = {"format": "mixion-catalog", "version": 1, "exported_at": datetime.now().isoformat()}
+        with self._pool.snapshot() as conn:
+            for table, (columns, _) in self.CATALOG_TABLES.items():
+                rows = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id").fetchall()
+                catalog[table] = [dict(r) for r in rows]
+            for table, columns in self.CATALOG_LINKS.items():
+                order = "drink_id, id" if table == "recipes" else "drink_id, extra_id"
+                rows = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order}").fetchall()
+                catalog[table] = [dict(r) for r in rows]
+        return catalog
+
+    def _validate_catalog(self, catalog: dict) -> list[str]:
+        errors = []
+        ids = {}
+        for table in list(self.CATALOG_TABLES) + list(self.CATALOG_LINKS):
+            rows = catalog.get(table, [])
+            if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+                errors.append(f"{table}: expected a list of objects")
+                catalog[table] = []
+
+        for table, (columns, defaults) in self.CATALOG_TABLES.items():
+            seen = set()
+            for n, row in enumerate(catalog.get(table, [])):
+                missing = [col for col in columns if col not in row and col not in defaults]
+                if missing:
+                    errors.append(f"{table}[{n}]: missing {', '.join(missing)}")
+                if row.get("id") in seen:
+                    errors.append(f"{table}[{n}]: duplicate id {row.get('id')!r}")
+                seen.add(row.get("id"))
+            existing = {r[0] for r in self.conn.execute(f"SELECT id FROM {table}")}
+            ids[table] = seen | existing
+
+        for table in self.CATALOG_UNIQUE_NAMES:
+            taken = {r["name"]: r["id"] for r in self.conn.execute(f"SELECT id, name FROM {table}")}
+            incoming = {}
+            for n, row in enumerate(catalog.get(table, [])):
+                name = row.get("name")
+                if name in incoming:
+                    errors.append(f"{table}[{n}]: duplicate name {name!r}")
+                incoming[name] = row.get("id")
+                if name in taken and taken[name] != row.get("id"):
+                    errors.append(f"{table}[{n}]: name {name!r} already used by id {taken[name]}")
+
+        for n, row in enumerate(catalog.get("recipes", [])):
+            missing = [col for col in self.CATALOG_LINKS["recipes"] if col not in row]
+            if missing:
+                errors.append(f"recipes[{n}]: missing {', '.join(missing)}")
+            elif not isinstance(row["amount_ml"], (int, float)) or row["amount_ml"] <= 0:
+                errors.append(f"recipes[{n}]: amount_ml must be a positive number")
+        for n, row in enumerate(catalog.get("recipe_extras", [])):
+            missing = [col for col in self.CATALOG_LINKS["recipe_extras"] if col not in row]
+            if missing:
+                errors.append(f"recipe_extras[{n}]: missing {', '.join(missing)}")
+
+        for table, refs in self.CATALOG_REFS.items():
+            for n, row in enumerate(catalog.get(table, [])):
+                for col, target in refs.items():
+                    value = row.get(col)
+                    if value is None and table == "bottles" and col == "ingredient_id":
+                        continue
+                    if col in row and value not in ids[target]:
+                        errors.append(f"{table}[{n}]: {col} {value!r} not found in {target}")
+        return errors
+
+    @_writes
+    def admin_import_catalog(self, catalog: dict, dry_run: bool = False) -> tuple[list[str], dict]:
+        """
+        Upsert a catalog document (the format admin_export_catalog produces).
+        Rows are matched by id; recipes and extras of every drink in the
+        document are replaced. Everything is written with executemany in one
+        transaction. Returns (errors, counts); with dry_run the transaction
+        is rolled back after writing, so counts and errors are exact.
+        """
+        errors = self._validate_catalog(catalog)
+        if errors:
+            return errors, {}
+
+        c = self.conn.cursor()
+        counts = {}
+        try:
+            for table, (columns, defaults) in self.CATALOG_TABLES.items():
+                rows = catalog.get(table, [])
+                if not rows:
+                    continue
+                existing = {r[0] for r in c.execute(f"SELECT id FROM {table}")}
+                values = []
+                for row in rows:
+                    record = {**defaults, **row}
+                    if table == "bottles" and record["current_ml"] is None:
+                        record["current_ml"] = record["capacity_ml"]
+                    values.append(tuple(record[col] for col in columns))
+                updates = ", ".join(f"{col}=excluded.{col}" for col in columns[1:])
+                c.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                    values
+                )
+                updated = sum(1 for row in rows if row["id"] in existing)
+                counts[table] = {"inserted": len(rows) - updated, "updated": updated}
+
+            drink_ids = {d["id"] for d in catalog.get("drinks", [])}
+            drink_ids |= {r["drink_id"] for table in self.CATALOG_LINKS for r in catalog.get(table, [])}
+            if drink_ids:
+                c.executemany("DELETE FROM recipes WHERE drink_id=?", [(d,) for d in drink_ids])
+                c.executemany("DELETE FROM recipe_extras WHERE drink_id=?", [(d,) for d in drink_ids])
+            for table, columns in self.CATALOG_LINKS.items():
+                rows = catalog.get(table, [])
+                c.executemany(
+                    f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(row[col] for col in columns) for row in rows]
+                )
+                counts[table] = {"replaced_for_drinks": len(drink_ids), "inserted": len(rows)}
+
+            for row in catalog.get("bottles", []):
+                current_ml = row.get("current_ml", row.get("capacity_ml", 1000))
+                self._append_outbox(c, sync_queue.KIND_INVENTORY, {
+                    "bottle_id": row["id"], "current_ml": current_ml, "reason": "import",
+                })
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            return [str(e)], {}
+
+        if dry_run:
+            self.conn.rollback()
+        else:
+            self.conn.commit()
+            self._invalidate_menu()
+            self._invalidate_pour_plans(None)
+        return [], counts
 
     # ── Admin: Logs ──────────────────────────────────────────────────────────
 
-    def admin_get_transactions(self, limit: int = 100):
+    def admin_get_transactions(self, limit: int = 100, before_id: int | None = None, drink_id: str | None = None,
+                               status: str | None = None, since: str | None = None, until: str | None = None):
+        """
+        Newest first. Keyset pagination: pass the smallest id of the previous
+        page as before_id. since/until are ISO timestamps (until exclusive).
+        """
+        where, params = [], []
+        if before_id is not None:
+            where.append("t.id < ?")
+            params.append(before_id)
+        if drink_id:
+            where.append("t.drink_id = ?")
+            params.append(drink_id)
+        if status:
+            where.append("t.status = ?")
+            params.append(status)
+        if since:
+            where.append("t.timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("t.timestamp < ?")
+            params.append(until)
         c = self.conn.cursor()
-        c.execute("""
+        c.execute(f"""
             SELECT t.*, d.name as drink_name
             FROM transactions t
             LEFT JOIN drinks d ON t.drink_id = d.id
+            {"WHERE " + " AND ".join(where) if where else ""}
             ORDER BY t.id DESC LIMIT ?
-        """, (limit,))
+        """, (*params, limit))
         return [dict(r) for r in c.fetchall()]
+
+
+    # ── Admin: Sales ─────────────────────────────────────────────────────────
+    # Read from sales_rollup only, so cost grows with drinks × hours in range,
+    # never with the size of the transaction log. since/until are ISO
+    # timestamps truncated to the hour (until exclusive).
+
+    @staticmethod
+    def _sales_range(since: str | None, until: str | None) -> tuple[str, list]:
+        where, params = [], []
+        if since:
+            where.append("r.hour >= ?")
+            params.append(since[:13])
+        if until:
+            where.append("r.hour < ?")
+            params.append(until[:13])
+        return ("WHERE " + " AND ".join(where) if where else ""), params
+
+    def admin_get_top_sellers(self, since: str | None = None, until: str | None = None,
+                              limit: int = 10, status: str = "completed"):
+        where, params = self._sales_range(since, until)
+        where = (where + " AND" if where else "WHERE") + " r.status = ?"
+        c = self.conn.cursor()
+        c.execute(f"""
+            SELECT r.drink_id, d.name as drink_name, SUM(r.count) as count, SUM(r.revenue) as revenue
+            FROM sales_rollup r
+            LEFT JOIN drinks d ON d.id = r.drink_id
+            {where}
+            GROUP BY r.drink_id
+            ORDER BY count DESC, revenue DESC LIMIT ?
+        """, (*params, status, limit))
+        return [dict(r) for r in c.fetchall()]
+
+    def admin_get_hourly_sales(self, since: str | None = None, until: str | None = None):
+        """One row per hour with counts per status and completed revenue."""
+        where, params = self._sales_range(since, until)
+        c = self.conn.cursor()
+        c.execute(f"""
+            SELECT r.hour, r.status, SUM(r.count) as count, SUM(r.revenue) as revenue
+            FROM sales_rollup r
+            {where}
+            GROUP BY r.hour, r.status
+            ORDER BY r.hour
+        """, params)
+        hours = {}
+        for row in c.fetchall():
+            bucket = hours.setdefault(row["hour"], {"hour": row["hour"], "total": 0, "revenue": 0.0, "statuses": {}})
+            bucket["statuses"][row["status"]] = row["count"]
+            bucket["total"] += row["count"]
+            if row["status"] == "completed":
+                bucket["revenue"] = row["revenue"]
+        return list(hours.values())
+
+    def admin_get_sales_summary(self, since: str | None = None, until: str | None = None):
+        where, params = self._sales_range(since, until)
+        c = self.conn.cursor()
+        c.execute(f"""
+            SELECT r.status, SUM(r.count) as count, SUM(r.revenue) as revenue
+            FROM sales_rollup r
+            {where}
+            GROUP BY r.status
+        """, params)
+        statuses = {row["status"]: {"count": row["count"], "revenue": row["revenue"]} for row in c.fetchall()}
+        completed = statuses.get("completed", {"count": 0, "revenue": 0.0})
+        return {
+            "orders": sum(s["count"] for s in statuses.values()),
+            "completed": completed["count"],
+            "revenue": completed["revenue"],
+            "statuses": statuses,
+        }
+
+
+# Time every public Database method for /metrics and the query profiler
+# (write() times the caller's block itself)
+for _name, _method in list(vars(Database).items()):
+    if not _name.startswith("_") and _name != "write" and inspect.isfunction(_method):
+        setattr(Database, _name, _timed(_method))
+del _name, _method
@@ -134,6 +134,141 @@ MIGRATIONS = [
             "ALTER TABLE lines ADD COLUMN calibration_value REAL DEFAULT 0.0"
         ],
     ),
+    (
+        5,
+        "Add covering indexes for recipe, bottle and transaction lookups",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_recipes_drink ON recipes(drink_id, ingredient_id, amount_ml)",
+            "CREATE INDEX IF NOT EXISTS idx_recipes_ingredient ON recipes(ingredient_id)",
+            "CREATE INDEX IF NOT EXISTS idx_bottles_ingredient ON bottles(ingredient_id, enabled, current_ml)",
+            "CREATE INDEX IF NOT EXISTS idx_bottles_line ON bottles(line_id)",
+            "CREATE INDEX IF NOT EXISTS idx_transactions_drink ON transactions(drink_id, timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)",
+        ],
+    ),
+    (
+        6,
+        "Add sync_outbox and sync_state tables for store-and-forward sync",
+        [
+            """CREATE TABLE IF NOT EXISTS sync_outbox (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind            TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                payload         TEXT NOT NULL,
+                created_at      TEXT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS sync_state (
+                key   TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )""",
+        ],
+    ),
+    (
+        7,
+        "Add transactions_archive table for transaction log retention",
+        [
+            """CREATE TABLE IF NOT EXISTS transactions_archive (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                first_id    INTEGER NOT NULL,
+                last_id     INTEGER NOT NULL,
+                first_ts    TEXT NOT NULL,
+                last_ts     TEXT NOT NULL,
+                row_count   INTEGER NOT NULL,
+                payload     BLOB NOT NULL,
+                archived_at TEXT NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status, id)",
+        ],
+    ),
+    (
+        8,
+        "Add trigger-maintained sales_rollup (drink x hour x status) and backfill it",
+        [
+            """CREATE TABLE IF NOT EXISTS sales_rollup (
+                drink_id TEXT NOT NULL,
+                hour     TEXT NOT NULL,
+                status   TEXT NOT NULL,
+                count    INTEGER NOT NULL DEFAULT 0,
+                revenue  REAL NOT NULL DEFAULT 0.0,
+                PRIMARY KEY (drink_id, hour, status)
+            ) WITHOUT ROWID""",
+            "CREATE INDEX IF NOT EXISTS idx_sales_rollup_hour ON sales_rollup(hour, status)",
+            """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_insert AFTER INSERT ON transactions
+            BEGIN
+                INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+                VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1,
+                        COALESCE((SELECT price FROM drinks WHERE id = NEW.drink_id), 0))
+                ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+                    count = count + 1, revenue = revenue + excluded.revenue;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_status AFTER UPDATE OF status ON transactions
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE sales_rollup SET
+                    count = count - 1,
+                    revenue = revenue - COALESCE((SELECT price FROM drinks WHERE id = OLD.drink_id), 0)
+                WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status;
+                DELETE FROM sales_rollup
+                WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status
+                  AND count <= 0;
+                INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+                VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1,
+                        COALESCE((SELECT price FROM drinks WHERE id = NEW.drink_id), 0))
+                ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+                    count = count + 1, revenue = revenue + excluded.revenue;
+            END""",
+            """INSERT OR IGNORE INTO sales_rollup (drink_id, hour, status, count, revenue)
+            SELECT t.drink_id, substr(t.timestamp, 1, 13), t.status, COUNT(*), COUNT(*) * COALESCE(d.price, 0)
+            FROM transactions t
+            LEFT JOIN drinks d ON d.id = t.drink_id
+            GROUP BY t.drink_id, substr(t.timestamp, 1, 13), t.status""",
+        ],
+    ),
+    (
+        9,
+        "Add admin_sessions so login tokens are shared across API worker processes",
+        [
+            """CREATE TABLE IF NOT EXISTS admin_sessions (
+                token      TEXT PRIMARY KEY,
+                username   TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            ) WITHOUT ROWID""",
+        ],
+    ),
+    (
+        10,
+        "Store the counted price on each transaction so sales_rollup revenue survives price changes",
+        [
+            "ALTER TABLE transactions ADD COLUMN price REAL",
+            """UPDATE transactions
+            SET price = COALESCE((SELECT price FROM drinks WHERE id = transactions.drink_id), 0)
+            WHERE price IS NULL""",
+            "DROP TRIGGER IF EXISTS trg_sales_rollup_insert",
+            "DROP TRIGGER IF EXISTS trg_sales_rollup_status",
+            """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_insert AFTER INSERT ON transactions
+            BEGIN
+                INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+                VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1, COALESCE(NEW.price, 0))
+                ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+                    count = count + 1, revenue = revenue + excluded.revenue;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_status AFTER UPDATE OF status ON transactions
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE sales_rollup SET
+                    count = count - 1,
+                    revenue = revenue - COALESCE(OLD.price, 0)
+                WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status;
+                DELETE FROM sales_rollup
+                WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status
+                  AND count <= 0;
+                INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+                VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1, COALESCE(OLD.price, 0))
+                ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+                    count = count + 1, revenue = revenue + excluded.revenue;
+            END""",
+        ],
+    ),
 ]
 
 
@@ -152,6 +287,13 @@ def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
     return c.fetchone() is not None
 
 
+def _index_exists(conn: sqlite3.Connection, index: str) -> bool:
+    c = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index,)
+    )
+    return c.fetchone() is not None
+
+
 def _is_alter_add_column(sql: str) -> tuple[bool, str, str]:
     """
     Detect 'ALTER TABLE <t> ADD [COLUMN] <col> ...' patterns.
@@ -209,13 +351,30 @@ REQUIRED_SCHEMA = {
     "recipes":          ["id", "drink_id", "ingredient_id", "amount_ml"],
     "extras":           ["id", "name", "price"],
     "recipe_extras":    ["drink_id", "extra_id"],
-    "transactions":     ["id", "drink_id", "status", "timestamp"],
+    "transactions":     ["id", "drink_id", "status", "timestamp", "price"],
+    "sync_outbox":      ["id", "kind", "idempotency_key", "payload", "created_at"],
+    "sync_state":       ["key", "value"],
+    "transactions_archive": ["id", "first_id", "last_id", "first_ts", "last_ts", "row_count", "payload", "archived_at"],
+    "sales_rollup":     ["drink_id", "hour", "status", "count", "revenue"],
+    "admin_sessions":   ["token", "username", "created_at"],
+}
+
+# index -> table
+REQUIRED_INDEXES = {
+    "idx_recipes_drink":          "recipes",
+    "idx_recipes_ingredient":     "recipes",
+    "idx_bottles_ingredient":     "bottles",
+    "idx_bottles_line":           "bottles",
+    "idx_transactions_drink":     "transactions",
+    "idx_transactions_timestamp": "transactions",
+    "idx_transactions_status":    "transactions",
+    "idx_sales_rollup_hour":      "sales_rollup",
 }
 
 
 def validate_schema(conn: sqlite3.Connection) -> bool:
     """
-    Verify that all required tables and columns exist.
+    Verify that all required tables, columns and indexes exist.
     Returns True if valid, False otherwise (and prints failures).
     """
     print("🔎 Validating schema integrity...")
@@ -230,13 +389,17 @@ def validate_schema(conn: sqlite3.Connection) -> bool:
             if col.lower() not in existing:
                 failures.append(f"  ✗ Missing column: '{table}.{col}'")
 
+    for index, table in REQUIRED_INDEXES.items():
+        if not _index_exists(conn, index):
+            failures.append(f"  ✗ Missing index: '{index}' on '{table}'")
+
     if failures:
         print("❌ Schema validation FAILED:")
         for f in failures:
             print(f)
         return False
 
-    print("✅ Schema validation passed — all required tables and columns present.")
+    print("✅ Schema validation passed — all required tables, columns and indexes present.")
     return True
 
 
@@ -0,0 +1,21 @@
+"""
+Archive of the transaction log.
+
+Transactions older than the retention window are moved out of the live
+`transactions` table into `transactions_archive`, one row per batch: the
+original rows as zlib-compressed NDJSON plus the id/time range they cover.
+See db/repositories/log_repo.py and services/retention_service.py.
+"""
+
+CREATE_ARCHIVE = """CREATE TABLE IF NOT EXISTS transactions_archive (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_id    INTEGER NOT NULL,
+    last_id     INTEGER NOT NULL,
+    first_ts    TEXT NOT NULL,
+    last_ts     TEXT NOT NULL,
+    row_count   INTEGER NOT NULL,
+    payload     BLOB NOT NULL,
+    archived_at TEXT NOT NULL
+)"""
+
+ARCHIVE_COLUMNS = ["id", "drink_id", "status", "timestamp", "price"]
@@ -0,0 +1,67 @@
+"""
+Sales rollup: one row per drink × hour × status with a count and revenue.
+Each transaction stores the drink's price when it was recorded
+(transactions.price) and the rollup only ever adds or moves that value, so
+later price changes don't skew past buckets. Triggers on `transactions`
+keep it current — an INSERT adds to its bucket, a status UPDATE moves the
+row from the old status bucket to the new one. Deletes (retention archival)
+deliberately leave the rollup alone, so reports cover archived history too.
+"""
+
+# Records the price the rollup counts; callers pass (drink_id, status, timestamp, drink_id)
+INSERT_TRANSACTION = """INSERT INTO transactions (drink_id, status, timestamp, price)
+    VALUES (?, ?, ?, (SELECT COALESCE(price, 0) FROM drinks WHERE id = ?))"""
+
+ADD_PRICE = "ALTER TABLE transactions ADD COLUMN price REAL"
+
+# Rows from before transactions.price existed: the best we know is today's price
+FILL_PRICE = """UPDATE transactions
+    SET price = COALESCE((SELECT price FROM drinks WHERE id = transactions.drink_id), 0)
+    WHERE price IS NULL"""
+
+CREATE_ROLLUP = """CREATE TABLE IF NOT EXISTS sales_rollup (
+    drink_id TEXT NOT NULL,
+    hour     TEXT NOT NULL,
+    status   TEXT NOT NULL,
+    count    INTEGER NOT NULL DEFAULT 0,
+    revenue  REAL NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (drink_id, hour, status)
+) WITHOUT ROWID"""
+
+CREATE_HOUR_INDEX = "CREATE INDEX IF NOT EXISTS idx_sales_rollup_hour ON sales_rollup(hour, status)"
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_sales_rollup_insert",
+    "DROP TRIGGER IF EXISTS trg_sales_rollup_status",
+]
+
+TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_insert AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+        VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1, COALESCE(NEW.price, 0))
+        ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+            count = count + 1, revenue = revenue + excluded.revenue;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_sales_rollup_status AFTER UPDATE OF status ON transactions
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE sales_rollup SET
+            count = count - 1,
+            revenue = revenue - COALESCE(OLD.price, 0)
+        WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status;
+        DELETE FROM sales_rollup
+        WHERE drink_id = OLD.drink_id AND hour = substr(OLD.timestamp, 1, 13) AND status = OLD.status
+          AND count <= 0;
+        INSERT INTO sales_rollup (drink_id, hour, status, count, revenue)
+        VALUES (NEW.drink_id, substr(NEW.timestamp, 1, 13), NEW.status, 1, COALESCE(OLD.price, 0))
+        ON CONFLICT(drink_id, hour, status) DO UPDATE SET
+            count = count + 1, revenue = revenue + excluded.revenue;
+    END""",
+]
+
+# Rebuild buckets from whatever is still in the live table
+BACKFILL = """INSERT OR IGNORE INTO sales_rollup (drink_id, hour, status, count, revenue)
+    SELECT drink_id, substr(timestamp, 1, 13), status, COUNT(*), SUM(COALESCE(price, 0))
+    FROM transactions
+    GROUP BY drink_id, substr(timestamp, 1, 13), status"""
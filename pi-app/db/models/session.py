@@ -0,0 +1,15 @@
+"""
+Admin sessions.
+
+Tokens issued by /api/admin/login live in SQLite rather than in process
+memory, so every API worker (multi-process mode) accepts the same tokens
+and a restart does not log the admin out. See db/repositories/session_repo.py.
+"""
+
+SESSION_MAX_AGE_DAYS = 7
+
+CREATE_SESSIONS = """CREATE TABLE IF NOT EXISTS admin_sessions (
+    token      TEXT PRIMARY KEY,
+    username   TEXT NOT NULL,
+    created_at TEXT NOT NULL
+) WITHOUT ROWID"""
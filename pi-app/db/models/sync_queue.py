@@ -0,0 +1,31 @@
+"""
+Store-and-forward outbox for syncing the Pi to the central server.
+
+Every pour and inventory change appends one row to sync_outbox inside the
+same SQLite transaction as the change itself, so nothing is lost if the
+app dies before the next sync. services/sync_service.py drains the table
+in batches; acknowledged rows are deleted and the highest acknowledged id
+is kept in sync_state so a restart resumes where it stopped. With no
+sync_url configured nothing is appended, so changes made while sync was
+off are not sent once it is turned on.
+"""
+
+KIND_TRANSACTION = "transaction"
+KIND_INVENTORY = "inventory"
+
+LAST_ACKED_KEY = "outbox_last_acked_id"
+
+CREATE_OUTBOX = """CREATE TABLE IF NOT EXISTS sync_outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind            TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE NOT NULL,
+    payload         TEXT NOT NULL,
+    created_at      TEXT NOT NULL
+)"""
+
+CREATE_STATE = """CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)"""
+
+INSERT_OUTBOX = "INSERT INTO sync_outbox (kind, idempotency_key, payload, created_at) VALUES (?,?,?,?)"
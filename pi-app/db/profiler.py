@@ -0,0 +1,230 @@
+"""
+db/profiler.py — Opt-in query profiler and slow-query log
+=========================================================
+  - Every Database method call and every statement run through a pool
+    connection is counted, with cumulative and max time, while enabled.
+  - Statements slower than the threshold are appended to a rotating log
+    (data/slow_queries.log) with their EXPLAIN QUERY PLAN.
+  - Off by default. Turn it on with "db_profile": true in config.json or at
+    runtime via POST /api/admin/db/profile; when off, the cost is one
+    attribute check per statement.
+
+Statement time is measured around execute(), i.e. until SQLite produced the
+first row. Time spent fetching the remaining rows shows up in the calling
+method's time instead.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+SLOW_LOG_PATH = os.path.join("data", "slow_queries.log")
+SLOW_LOG_BYTES = 1024 * 1024
+SLOW_LOG_BACKUPS = 3
+MAX_STATEMENTS = 500      # distinct statements tracked; the rest are folded into "(other)"
+
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "callers")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.callers = set()
+
+    def add(self, elapsed: float, caller: str | None = None):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if caller and len(self.callers) < 8:
+            self.callers.add(caller)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.threshold_ms = 50.0
+        config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
+        try:
+            with open(config_path, "r") as f:
+                config = json.load(f)
+                self.enabled = bool(config.get("db_profile", False))
+                self.threshold_ms = float(config.get("db_slow_query_ms", self.threshold_ms))
+        except Exception as e:
+            print(f"⚠️ Could not load config.json: {e}")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._statements: dict[str, _Stat] = {}
+        self._methods: dict[str, _Stat] = {}
+        self._plans: dict[str, list[str]] = {}
+        self._slow_count = 0
+        self._logger = None
+        self.started_at = time.time()
+
+    def configure(self, enabled: bool | None = None, threshold_ms: float | None = None):
+        if threshold_ms is not None:
+            self.threshold_ms = float(threshold_ms)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._methods.clear()
+            self._plans.clear()
+            self._slow_count = 0
+            self.started_at = time.time()
+
+    # ── Recording ───────────────────────────────────────────────────────────
+
+    def enter_method(self, name: str):
+        stack = getattr(self._local, "methods", None)
+        if stack is None:
+            stack = self._local.methods = []
+        stack.append(name)
+
+    def exit_method(self, name: str, elapsed: float):
+        stack = self._local.methods
+        stack.pop()
+        if self.enabled:
+            with self._lock:
+                stat = self._methods.get(name)
+                if stat is None:
+                    stat = self._methods[name] = _Stat()
+                stat.add(elapsed)
+
+    def _caller(self) -> str | None:
+        stack = getattr(self._local, "methods", None)
+        return stack[-1] if stack else None
+
+    def record_statement(self, conn: sqlite3.Connection, sql: str, params, elapsed: float):
+        key = _WHITESPACE.sub(" ", sql).strip()
+        caller = self._caller()
+        with self._lock:
+            stat = self._statements.get(key)
+            if stat is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    key = "(other)"
+                    stat = self._statements.setdefault(key, _Stat())
+                else:
+                    stat = self._statements[key] = _Stat()
+            stat.add(elapsed, caller)
+        if elapsed * 1000 >= self.threshold_ms:
+            self._log_slow(conn, key, params, elapsed, caller)
+
+    # ── Slow-query log ──────────────────────────────────────────────────────
+
+    def _log_slow(self, conn, sql: str, params, elapsed: float, caller: str | None):
+        plan = self._plan(conn, sql, params)
+        with self._lock:
+            self._slow_count += 1
+        if self._logger is None:
+            self._logger = self._open_log()
+        self._logger.warning(json.dumps({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ms": round(elapsed * 1000, 3),
+            "method": caller,
+            "sql": sql,
+            "params": repr(params)[:200] if params else None,
+            "plan": plan,
+        }))
+
+    def _open_log(self) -> logging.Logger:
+        logger = logging.getLogger("mixion.slow_query")
+        logger.propagate = False
+        if not logger.handlers:
+            os.makedirs(os.path.dirname(SLOW_LOG_PATH), exist_ok=True)
+            handler = RotatingFileHandler(SLOW_LOG_PATH, maxBytes=SLOW_LOG_BYTES, backupCount=SLOW_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        return logger
+
+    def _plan(self, conn, sql: str, params) -> list[str] | None:
+        if sql in self._plans:
+            return self._plans[sql]
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            # A plain cursor, so the EXPLAIN itself is not profiled
+            rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+        except sqlite3.Error as e:
+            return [f"(EXPLAIN failed: {e})"]
+        depth = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            plan.append("  " * depth[node_id] + detail)
+        with self._lock:
+            self._plans[sql] = plan
+        return plan
+
+    # ── Report ──────────────────────────────────────────────────────────────
+
+    def report(self, limit: int = 20, sort: str = "total") -> dict:
+        field = {"total": "total", "max": "max", "count": "count", "mean": None}.get(sort, "total")
+
+        def top(stats: dict) -> list:
+            if field is None:
+                ordered = sorted(stats.items(), key=lambda kv: kv[1].total / kv[1].count, reverse=True)
+            else:
+                ordered = sorted(stats.items(), key=lambda kv: getattr(kv[1], field), reverse=True)
+            return ordered[:limit]
+
+        with self._lock:
+            statements = [
+                {"sql": sql, **stat.as_dict(), "methods": sorted(stat.callers), "plan": self._plans.get(sql)}
+                for sql, stat in top(self._statements)
+            ]
+            methods = [{"method": name, **stat.as_dict()} for name, stat in top(self._methods)]
+            slow = self._slow_count
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "since": self.started_at,
+            "slow_queries": slow,
+            "slow_log": SLOW_LOG_PATH,
+            "statements": statements,
+            "methods": methods,
+        }
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        if not profiler.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profiler.record_statement(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not profiler.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        rows = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, rows)
+        finally:
+            profiler.record_statement(self.connection, sql, rows[0] if rows else None, time.perf_counter() - start)
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,68 @@
+from db.database import Database
+
+# Transaction statuses whose stock actually left the bottles. "failed" rows had
+# their reservation put back by release_reservation; "started" rows are still
+# holding theirs.
+CONSUMED_STATUSES = ("started", "completed", "error")
+
+
+class InventoryRepository:
+    """Set-based consumption queries for the depletion forecast."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def consumption_by_bottle(self, since_hours: list[str]) -> dict[int, dict]:
+        """
+        ml poured from each bottle since each hour key ('YYYY-MM-DDTHH'), plus the
+        number of pours since the oldest one, in one pass over sales_rollup ×
+        recipes. Past sales are costed with today's recipes.
+        Returns {bottle_id: {"ml": [ml since since_hours[0], ...], "pours": n}}.
+        """
+        columns = ", ".join("SUM(CASE WHEN s.hour >= ? THEN s.count * r.amount_ml ELSE 0 END)" for _ in since_hours)
+        marks = ",".join("?" * len(CONSUMED_STATUSES))
+        rows = self.db.conn.execute(f"""
+            SELECT b.id, SUM(s.count), {columns}
+            FROM sales_rollup s
+            JOIN recipes r ON r.drink_id = s.drink_id
+            JOIN bottles b ON b.ingredient_id = r.ingredient_id
+            WHERE s.hour >= ? AND s.status IN ({marks})
+            GROUP BY b.id
+        """, (*since_hours, min(since_hours), *CONSUMED_STATUSES)).fetchall()
+        return {row[0]: {"pours": row[1], "ml": [v or 0.0 for v in row[2:]]} for row in rows}
+
+    def bottles(self) -> list[dict]:
+        rows = self.db.conn.execute("""
+            SELECT b.id, b.capacity_ml, b.current_ml, b.enabled,
+                   i.name as ingredient_name, l.name as line_name
+            FROM bottles b
+            LEFT JOIN ingredients i ON b.ingredient_id = i.id
+            LEFT JOIN lines l ON b.line_id = l.id
+        """).fetchall()
+        return [dict(r) for r in rows]
+
+    def levels(self, bottle_ids) -> dict[int, float]:
+        bottle_ids = list(bottle_ids)
+        if not bottle_ids:
+            return {}
+        rows = self.db.conn.execute(
+            f"SELECT id, current_ml FROM bottles WHERE id IN ({','.join('?' * len(bottle_ids))})",
+            bottle_ids
+        ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def drinks_by_bottle(self) -> dict[int, list[dict]]:
+        rows = self.db.conn.execute("""
+            SELECT b.id as bottle_id, d.id as drink_id, d.name as drink_name, r.amount_ml
+            FROM bottles b
+            JOIN recipes r ON r.ingredient_id = b.ingredient_id
+            JOIN drinks d ON d.id = r.drink_id
+            WHERE r.amount_ml > 0
+            ORDER BY d.name
+        """).fetchall()
+        by_bottle = {}
+        for row in rows:
+            by_bottle.setdefault(row["bottle_id"], []).append(
+                {"drink_id": row["drink_id"], "drink_name": row["drink_name"], "amount_ml": row["amount_ml"]}
+            )
+        return by_bottle
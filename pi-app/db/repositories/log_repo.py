@@ -0,0 +1,51 @@
+import json
+import zlib
+from datetime import datetime
+from db.database import Database
+from db.models import log
+
+
+class TransactionArchive:
+    """Moves old transactions into compressed batches in transactions_archive."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def archive_batch(self, cutoff: str, batch_size: int = 500) -> int:
+        """
+        Archive up to batch_size transactions older than cutoff (ISO timestamp)
+        in one short write transaction. Returns the number of rows moved;
+        0 means nothing older than cutoff is left.
+        """
+        with self.db.write("log_repo.archive_batch") as conn:
+            c = conn.cursor()
+            rows = c.execute(
+                f"SELECT {', '.join(log.ARCHIVE_COLUMNS)} FROM transactions "
+                "WHERE timestamp < ? ORDER BY id LIMIT ?",
+                (cutoff, batch_size)
+            ).fetchall()
+            if not rows:
+                return 0
+            payload = "\n".join(json.dumps(dict(r), separators=(",", ":")) for r in rows)
+            c.execute(
+                "INSERT INTO transactions_archive "
+                "(first_id, last_id, first_ts, last_ts, row_count, payload, archived_at) VALUES (?,?,?,?,?,?,?)",
+                (rows[0]["id"], rows[-1]["id"], min(r["timestamp"] for r in rows), max(r["timestamp"] for r in rows),
+                 len(rows), zlib.compress(payload.encode(), 9), datetime.now().isoformat())
+            )
+            c.executemany("DELETE FROM transactions WHERE id=?", [(r["id"],) for r in rows])
+            conn.commit()
+            return len(rows)
+
+    def list_batches(self) -> list[dict]:
+        rows = self.db.conn.execute(
+            "SELECT id, first_id, last_id, first_ts, last_ts, row_count, length(payload) AS bytes, archived_at "
+            "FROM transactions_archive ORDER BY id"
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def read_batch(self, batch_id: int) -> list[dict] | None:
+        row = self.db.conn.execute("SELECT payload FROM transactions_archive WHERE id=?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return [json.loads(line) for line in zlib.decompress(row["payload"]).decode().splitlines()]
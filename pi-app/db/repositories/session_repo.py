@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from db.database import Database
+from db.models import session
+
+
+class SessionRepository:
+    """Admin login tokens shared by every process using the database."""
+
+    def __init__(self, db: Database, max_age_days: int = session.SESSION_MAX_AGE_DAYS):
+        self.db = db
+        self.max_age = timedelta(days=max_age_days)
+
+    def _cutoff(self) -> str:
+        return (datetime.now() - self.max_age).isoformat()
+
+    def create(self, token: str, username: str):
+        with self.db.write("session_repo.create") as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM admin_sessions WHERE created_at < ?", (self._cutoff(),))
+            c.execute(
+                "INSERT INTO admin_sessions (token, username, created_at) VALUES (?,?,?)",
+                (token, username, datetime.now().isoformat())
+            )
+            conn.commit()
+
+    def is_valid(self, token: str) -> bool:
+        if not token:
+            return False
+        row = self.db.conn.execute(
+            "SELECT 1 FROM admin_sessions WHERE token=? AND created_at >= ?", (token, self._cutoff())
+        ).fetchone()
+        return row is not None
+
+    def delete(self, token: str):
+        with self.db.write("session_repo.delete") as conn:
+            conn.execute("DELETE FROM admin_sessions WHERE token=?", (token,))
+            conn.commit()
+
+    def count(self) -> int:
+        return self.db.conn.execute(
+            "SELECT COUNT(*) FROM admin_sessions WHERE created_at >= ?", (self._cutoff(),)
+        ).fetchone()[0]
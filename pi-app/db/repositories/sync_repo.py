@@ -0,0 +1,43 @@
+from db.database import Database
+from db.models import sync_queue
+
+
+class SyncRepository:
+    """Reads and acknowledges rows in the local sync outbox."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def last_acked_id(self) -> int:
+        row = self.db.conn.execute(
+            "SELECT value FROM sync_state WHERE key=?", (sync_queue.LAST_ACKED_KEY,)
+        ).fetchone()
+        return int(row["value"]) if row else 0
+
+    def pending(self, limit: int) -> list[dict]:
+        # Rows at or below the acked offset are normally deleted already; the
+        # offset guards against re-sending if the delete was interrupted.
+        rows = self.db.conn.execute(
+            "SELECT id, kind, idempotency_key, payload, created_at FROM sync_outbox "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (self.last_acked_id(), limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def pending_count(self) -> int:
+        return self.db.conn.execute(
+            "SELECT COUNT(*) FROM sync_outbox WHERE id > ?", (self.last_acked_id(),)
+        ).fetchone()[0]
+
+    def ack(self, through_id: int):
+        """Record everything up to through_id as delivered and drop those rows."""
+        with self.db.write("sync_repo.ack") as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value "
+                "WHERE CAST(excluded.value AS INTEGER) > CAST(sync_state.value AS INTEGER)",
+                (sync_queue.LAST_ACKED_KEY, str(through_id))
+            )
+            c.execute("DELETE FROM sync_outbox WHERE id <= ?", (through_id,))
+            conn.commit()
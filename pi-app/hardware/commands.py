@@ -0,0 +1,83 @@
+import time
+import uuid
+from concurrent.futures import Future
+
+# ESP32 firmware limits (see the protocol notes at the top of test.py)
+CMD_TIMEOUT_SEC = 5.0       # ESP discards a CMD if VERIFIED doesn't arrive in time
+MAX_EXEC_TIME_SEC = 20.0    # ESP aborts execution after this long
+
+# Command lifecycle:
+#   SENT → VERIFIED (ACK received, VERIFIED sent) → RUNNING (STARTED) → STEP_DONE* → DONE
+# Any state can end in ERROR, DISCARDED or TIMEOUT.
+SENT = "SENT"
+VERIFIED = "VERIFIED"
+RUNNING = "RUNNING"
+DONE = "DONE"
+ERROR = "ERROR"
+DISCARDED = "DISCARDED"
+TIMEOUT = "TIMEOUT"
+FINAL_STATES = {DONE, ERROR, DISCARDED, TIMEOUT}
+
+
+class DispenseCommand:
+    """One CMD sent to the ESP32, tracked by msg_id until it finishes."""
+
+    def __init__(self, jobs: list, msg_id: str | None = None, max_attempts: int = 3):
+        self.msg_id = msg_id or str(uuid.uuid4())
+        self.jobs = jobs
+        self.state = SENT
+        self.reason = None
+        self.attempts = 0
+        self.max_attempts = max_attempts
+        self.relays_done = []
+        self.created_at = time.time()
+        self.sent_at = None
+        self.verified_at = None
+        self.started_at = None
+        self.finished_at = None
+        self.retry_at = None
+        # Resolved with self.result() once a final state is reached; await it
+        # with asyncio.wrap_future() or block on .result(timeout)
+        self.future: Future = Future()
+
+    @property
+    def payload(self) -> dict:
+        return {"type": "CMD", "msg_id": self.msg_id, "jobs": self.jobs}
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINAL_STATES
+
+    @property
+    def planned_duration(self) -> float:
+        # Relays run in parallel, so the pour takes as long as the longest job
+        return max((float(j.get("duration", 0)) for j in self.jobs), default=0.0)
+
+    def deadline(self, ack_timeout: float, exec_grace: float) -> float | None:
+        if self.state == SENT:
+            return (self.sent_at or self.created_at) + ack_timeout
+        if self.state == VERIFIED:
+            return self.verified_at + CMD_TIMEOUT_SEC + 0.5
+        if self.state == RUNNING:
+            return self.started_at + min(self.planned_duration, MAX_EXEC_TIME_SEC) + exec_grace
+        return None
+
+    def result(self) -> dict:
+        return {
+            "msg_id": self.msg_id,
+            "status": self.state,
+            "reason": self.reason,
+            "started": self.started_at is not None,
+            "relays_done": list(self.relays_done),
+            "attempts": self.attempts,
+        }
+
+    def snapshot(self) -> dict:
+        data = self.result()
+        data.update({
+            "jobs": self.jobs,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        })
+        return data
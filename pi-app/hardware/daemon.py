@@ -0,0 +1,178 @@
+"""
+hardware/daemon.py — Hardware daemon for multi-process mode
+===========================================================
+Usage (from pi-app/):
+  python -m hardware.daemon [--socket data/hardware.sock]
+
+Owns everything that must exist once per machine: the serial port, the
+dispense scheduler, the pour service (and its plan cache), plus the sync and
+retention background jobs. API workers started with `run.py --workers N`
+reach it over a Unix domain socket with newline-delimited JSON:
+
+  → {"id": 1, "op": "dispense", "args": {"drink_id": "CK01", "priority": 0}}
+  ← {"id": 1, "ok": true, "result": {...}}
+  ← {"id": 1, "ok": false, "status_code": 409, "detail": "Drink unavailable: ..."}
+
+Ops: dispense, order, queue, status, sync_stats, sync_wake, subscribe, publish.
+After "subscribe" the daemon pushes {"event": ..., "data": ...} lines on that
+connection: device/heartbeat/pour/command/order events from the hardware and
+menu/inventory/pour_plans changes from any process. Workers send their own
+database changes as {"op": "publish", "event": ..., "data": ...}; the daemon
+applies them to its caches and relays them to the other workers.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+from fastapi import HTTPException
+from db.database import Database
+from hardware.gateway import LocalHardware, socket_path
+
+# A worker that stops reading its event stream is dropped past this much backlog
+MAX_SUBSCRIBER_BUFFER = 256 * 1024
+
+
+class HardwareDaemon:
+    def __init__(self, path: str):
+        from services.retention_service import RetentionService
+        from services.sync_service import SyncService
+
+        self.path = path
+        self.db = Database.shared()
+        self.hardware = LocalHardware(self.db)
+        self.sync_service = SyncService(self.db)
+        self.retention_service = RetentionService(self.db)
+        self._loop = None
+        self._subscribers: set[asyncio.StreamWriter] = set()
+        self._stop = None
+
+    # ── Events ──────────────────────────────────────────────────────────────
+
+    def publish(self, event: str, data: dict, origin=None):
+        """Thread-safe: fan an event out to every subscribed worker except origin."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, event, data, origin)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    def _deliver(self, event: str, data: dict, origin):
+        if not self._subscribers:
+            return
+        line = (json.dumps({"event": event, "data": data}) + "\n").encode("utf-8")
+        for writer in list(self._subscribers):
+            if writer is origin:
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                print("⚠️ Dropping a worker that stopped reading its event stream")
+                self._subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    # ── Requests ────────────────────────────────────────────────────────────
+
+    def _call(self, op: str, args: dict):
+        # Runs on the default executor; database and serial calls may block
+        if op == "dispense":
+            return self.hardware.dispense(args["drink_id"], int(args.get("priority", 0)))
+        if op == "order":
+            return self.hardware.order_status(args["order_id"])
+        if op == "queue":
+            return self.hardware.queue()
+        if op == "status":
+            return self.hardware.status()
+        if op == "sync_stats":
+            return self.sync_service.stats()
+        if op == "sync_wake":
+            self.sync_service.wake()
+            return None
+        raise HTTPException(status_code=400, detail=f"Unknown op {op!r}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                op = request.get("op")
+
+                if op == "publish":
+                    event, data = request.get("event"), request.get("data") or {}
+                    Database.apply_remote_change(event, data)
+                    self._deliver(event, data, origin=writer)
+                    continue
+
+                try:
+                    if op == "subscribe":
+                        self._subscribers.add(writer)
+                        result = {"device_online": self.hardware.device_online}
+                    else:
+                        result = await loop.run_in_executor(None, self._call, op, request.get("args") or {})
+                    reply = {"id": request.get("id"), "ok": True, "result": result}
+                except HTTPException as e:
+                    reply = {"id": request.get("id"), "ok": False, "status_code": e.status_code, "detail": e.detail}
+                except Exception as e:
+                    reply = {"id": request.get("id"), "ok": False, "status_code": 500, "detail": str(e)}
+                writer.write((json.dumps(reply, default=str) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self._loop.add_signal_handler(sig, self._stop.set)
+
+        self.hardware.start(self._loop, self.publish)
+        Database.add_change_listener(self.publish, relay=True)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)    # stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+
+        self.sync_service.start()
+        self.retention_service.start()
+        print(f"🔌 Hardware daemon listening on {self.path}")
+        try:
+            await self._stop.wait()
+        finally:
+            print("🛑 Hardware daemon stopping...")
+            server.close()
+            for writer in list(self._subscribers):
+                writer.close()
+            await server.wait_closed()
+            self.retention_service.stop()
+            self.sync_service.stop()
+            self.hardware.stop()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m hardware.daemon", description=__doc__.split("\n")[1])
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: hardware_socket in config.json)")
+    args = parser.parse_args(argv)
+    asyncio.run(HardwareDaemon(args.socket or socket_path()).serve())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import json
+import re
+
+
+class LineFramer:
+    """
+    Splits the ESP32 byte stream into newline-terminated frames.
+    Bytes are appended to one bytearray and consumed in a single slice per
+    feed, so bursts of short lines cost linear time instead of re-copying
+    the remaining buffer for every line.
+    """
+
+    def __init__(self, max_line: int = 4096):
+        self.max_line = max_line
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        buf = self._buf
+        buf += data
+        frames = []
+        start = 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl == -1:
+                break
+            frames.append(bytes(buf[start:nl]))
+            start = nl + 1
+        if start:
+            del buf[:start]
+        # A partial line this long is line noise (e.g. boot garbage) — drop it
+        if len(buf) > self.max_line:
+            buf.clear()
+        return frames
+
+    def reset(self):
+        self._buf.clear()
+
+
+# Repairs {type:"LIVE"} -> {"type":"LIVE"}; only used when strict parsing fails
+_UNQUOTED_KEY = re.compile(r'([{,])\s*([a-zA-Z0-9_]+)\s*:')
+
+
+class FrameDecoder:
+    """
+    Decodes one ESP32 line into a dict. Well-formed JSON is parsed straight
+    from the bytes; only frames that fail strict parsing go through the
+    trim-and-quote repair pass. Counts decoded, repaired and dropped frames.
+    """
+
+    def __init__(self):
+        self.decoded = 0
+        self.repaired = 0
+        self.dropped = 0
+
+    def decode(self, frame: bytes) -> dict | None:
+        try:
+            obj = json.loads(frame)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict):
+            self.decoded += 1
+            return obj
+
+        obj = self._repair(frame)
+        if obj is None:
+            self.dropped += 1
+            return None
+        self.repaired += 1
+        return obj
+
+    @staticmethod
+    def _repair(frame: bytes) -> dict | None:
+        line = frame.decode(errors="ignore")
+        # Extract JSON object if there's garbage around it
+        start_idx = line.find("{")
+        end_idx = line.rfind("}")
+        if start_idx == -1 or end_idx <= start_idx:
+            return None
+        line = _UNQUOTED_KEY.sub(r'\1"\2":', line[start_idx:end_idx + 1])
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
+    def stats(self) -> dict:
+        return {"decoded": self.decoded, "repaired": self.repaired, "dropped": self.dropped}
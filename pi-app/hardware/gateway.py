@@ -0,0 +1,112 @@
+"""
+hardware/gateway.py — How the API reaches the dispenser
+=======================================================
+  - "local" (default): this process owns the serial port, the dispense
+    scheduler and the pour service. One uvicorn process, as before.
+  - "daemon": a separate hardware daemon (python -m hardware.daemon) owns
+    them and listens on a Unix socket; every API worker talks to it through
+    hardware.remote.HardwareClient. Workers keep no hardware state, so
+    uvicorn can run one per core.
+
+The mode comes from MIXION_HARDWARE (set by `run.py --workers N`) or
+"hardware_mode" in config.json. Both gateways expose the same methods, and
+the daemon serves its requests from a LocalHardware.
+"""
+
+import json
+import os
+
+DEFAULT_SOCKET = os.path.join("data", "hardware.sock")
+
+
+def _config() -> dict:
+    config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
+    try:
+        with open(config_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not load config.json: {e}")
+        return {}
+
+
+def hardware_mode() -> str:
+    return os.environ.get("MIXION_HARDWARE") or _config().get("hardware_mode", "local")
+
+
+def socket_path() -> str:
+    return os.environ.get("MIXION_HARDWARE_SOCKET") or _config().get("hardware_socket", DEFAULT_SOCKET)
+
+
+class LocalHardware:
+    """Serial port, scheduler and pour service living in this process."""
+    remote = False
+
+    def __init__(self, db=None):
+        from db.database import Database
+        from hardware.serial_client import SerialClient
+        from services.dispense_scheduler import DispenseScheduler
+        from services.pour_service import PourService
+
+        self.db = db or Database.shared()
+        self.serial = SerialClient()
+        self.scheduler = DispenseScheduler(self.serial)
+        self.pour_service = PourService(self.db, self.serial, self.scheduler)
+
+    @property
+    def device_online(self) -> bool:
+        return self.serial.device_online
+
+    def start(self, loop, publish):
+        """Start reading the port on `loop`; publish(event, data) gets serial and order events."""
+        # No CMD outlives the process that sent it; close orders a previous run left open
+        stale = self.db.close_stale_transactions()
+        if stale:
+            print(f"⚠️ Marked {stale} unfinished order(s) from a previous run as error")
+        self.serial.add_listener(publish)
+        self.scheduler.add_listener(publish)
+        self.serial.start(loop)
+
+    def stop(self):
+        pass
+
+    def dispense(self, drink_id: str, priority: int = 0) -> dict:
+        # Raises HTTPException(409) if unavailable, 503 if the queue is full
+        return self.pour_service.dispense(drink_id, priority=priority)
+
+    def order_status(self, order_id: str) -> dict | None:
+        job = self.scheduler.get(order_id)
+        if job is not None:
+            status = job.snapshot()
+            status.update(self.scheduler.position(order_id))
+            return status
+        # Raw CMD msg_id
+        cmd = self.serial.get_command(order_id)
+        return cmd.snapshot() if cmd is not None else None
+
+    def queue(self) -> dict:
+        stats = self.scheduler.stats()
+        stats["pour_plans"] = self.pour_service.plan_stats()
+        return stats
+
+    def status(self) -> dict:
+        return {
+            "device_online": self.serial.device_online,
+            "inflight_orders": len(self.serial.inflight_commands()),
+            "serial_frames": self.serial.frame_stats,
+            "serial_tx": self.serial.tx_stats,
+        }
+
+
+_hardware = None
+
+
+def get_hardware():
+    """The process-wide gateway for the configured mode."""
+    global _hardware
+    if _hardware is None:
+        if hardware_mode() == "daemon":
+            from hardware.remote import HardwareClient
+            _hardware = HardwareClient(socket_path())
+        else:
+            _hardware = LocalHardware()
+    return _hardware
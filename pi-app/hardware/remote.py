@@ -0,0 +1,215 @@
+import itertools
+import json
+import socket
+import threading
+from fastapi import HTTPException
+from db.database import Database
+
+
+class RemoteSyncService:
+    """The hardware daemon's SyncService, as seen from an API worker."""
+
+    def __init__(self, client: "HardwareClient"):
+        self._client = client
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.stats().get("enabled"))
+
+    def stats(self) -> dict:
+        return self._client.request("sync_stats")
+
+    def wake(self):
+        self._client.request("sync_wake")
+
+    def start(self):
+        pass    # runs in the daemon
+
+    def stop(self, timeout: float = 5.0):
+        pass
+
+
+class HardwareClient:
+    """
+    API-worker side of multi-process mode (see hardware/daemon.py).
+
+    Requests use one blocking Unix-socket connection per thread, so uvicorn's
+    threadpool can have several in flight. A background thread keeps an event
+    subscription open: hardware events are republished to this worker's
+    /api/events clients, and menu/inventory changes made in other processes
+    are applied to this worker's caches. Local database changes go the other
+    way over the same connection.
+    """
+    remote = True
+
+    def __init__(self, path: str, timeout_sec: float = 10.0):
+        self.path = path
+        self.timeout_sec = timeout_sec
+        self.device_online = False
+        self.connected = False
+        self.reconnect_delay_sec = 1.0
+        self.sync_service = RemoteSyncService(self)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._publish = None
+        self._events_sock = None
+        self._events_lock = threading.Lock()
+        self._resync = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ── Requests ────────────────────────────────────────────────────────────
+
+    def _connect(self, timeout: float | None) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(self.path)
+        return sock
+
+    def _channel(self):
+        channel = getattr(self._local, "channel", None)
+        if channel is None:
+            sock = self._connect(self.timeout_sec)
+            channel = self._local.channel = (sock, sock.makefile("rb"))
+        return channel
+
+    def _drop_channel(self):
+        channel = getattr(self._local, "channel", None)
+        self._local.channel = None
+        if channel is not None:
+            channel[1].close()
+            channel[0].close()
+
+    def request(self, op: str, **args):
+        """Call an op on the daemon; its errors are re-raised as the same HTTPException."""
+        line = (json.dumps({"id": next(self._ids), "op": op, "args": args}) + "\n").encode("utf-8")
+        for attempt in (1, 2):
+            try:
+                sock, reader = self._channel()
+                sock.sendall(line)
+                break
+            except OSError:
+                # A connection left over from before a daemon restart; nothing was sent
+                self._drop_channel()
+                if attempt == 2:
+                    raise HTTPException(status_code=503, detail="Hardware daemon unavailable")
+        try:
+            reply = reader.readline()
+        except OSError:
+            reply = b""
+        if not reply:
+            # The request may or may not have run — never resend it
+            self._drop_channel()
+            raise HTTPException(status_code=503, detail="Hardware daemon unavailable")
+        reply = json.loads(reply)
+        if not reply.get("ok"):
+            raise HTTPException(status_code=reply.get("status_code", 500), detail=reply.get("detail"))
+        return reply.get("result")
+
+    def dispense(self, drink_id: str, priority: int = 0) -> dict:
+        return self.request("dispense", drink_id=drink_id, priority=priority)
+
+    def order_status(self, order_id: str) -> dict | None:
+        return self.request("order", order_id=order_id)
+
+    def queue(self) -> dict:
+        return self.request("queue")
+
+    def status(self) -> dict:
+        return self.request("status")
+
+    # ── Events ──────────────────────────────────────────────────────────────
+
+    def start(self, loop, publish):
+        """publish(event, data) gets hardware events; other processes' changes go to the change listeners."""
+        self._publish = publish
+        Database.add_change_listener(self._forward, relay=True)
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._event_loop, name="hardware-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._events_lock:
+            if self._events_sock is not None:
+                try:
+                    self._events_sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self._thread:
+            self._thread.join(2.0)
+
+    @staticmethod
+    def _publish_line(event: str, data: dict) -> bytes:
+        return (json.dumps({"op": "publish", "event": event, "data": data}) + "\n").encode("utf-8")
+
+    def _forward(self, event: str, data: dict):
+        # A change committed by this worker: tell the daemon and, through it, the other workers
+        message = self._publish_line(event, data)
+        with self._events_lock:
+            if self._events_sock is not None:
+                try:
+                    self._events_sock.sendall(message)
+                    return
+                except OSError:
+                    pass
+            # Lost: the other processes reset everything once we are back (see _subscribe)
+            if not self._resync:
+                print(f"⚠️ Hardware daemon unreachable, {event} change not forwarded — full resync on reconnect")
+            self._resync = True
+
+    def _event_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._subscribe()
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"⏳ Waiting for hardware daemon at {self.path} ({e})...")
+            self._set_connected(False)
+            self._stop.wait(self.reconnect_delay_sec)
+
+    def _subscribe(self):
+        sock = self._connect(self.timeout_sec)
+        try:
+            reader = sock.makefile("rb")
+            sock.sendall((json.dumps({"id": 0, "op": "subscribe"}) + "\n").encode("utf-8"))
+            hello = json.loads(reader.readline() or b"{}")
+            sock.settimeout(None)
+            with self._events_lock:
+                if self._resync:
+                    # Changes made here while disconnected never reached the others
+                    for event, data in (("pour_plans", {"drinks": None}), ("menu", {})):
+                        sock.sendall(self._publish_line(event, data))
+                    self._resync = False
+                self._events_sock = sock
+            # Anything may have changed while disconnected
+            Database.apply_remote_change("pour_plans", {"drinks": None})
+            self._emit("menu", {})
+            self._set_connected(True, bool((hello.get("result") or {}).get("device_online")))
+            for line in reader:
+                message = json.loads(line)
+                if "event" in message:
+                    self._emit(message["event"], message.get("data") or {})
+        finally:
+            with self._events_lock:
+                self._events_sock = None
+            sock.close()
+
+    def _emit(self, event: str, data: dict):
+        if event in ("menu", "inventory", "pour_plans"):
+            # Reaches /api/events and the other change listeners like a local change
+            Database.apply_remote_change(event, data)
+            return
+        if event == "device":
+            self.device_online = bool(data.get("online"))
+        if self._publish is not None:
+            self._publish(event, data)
+
+    def _set_connected(self, connected: bool, device_online: bool = False):
+        was_online = self.device_online
+        self.connected = connected
+        self.device_online = connected and device_online
+        if self.device_online != was_online:
+            self._emit("device", {"online": self.device_online})
@@ -1,7 +1,16 @@
+import importlib.util
 import json
+import logging
 import os
 import time
 import threading
+from collections import OrderedDict, deque
+from hardware import commands
+from hardware.commands import DispenseCommand
+from hardware.framing import FrameDecoder, LineFramer
+from services import metrics
+
+logger = logging.getLogger(__name__)
 
 class SerialClient:
     _instance = None
@@ -17,18 +26,47 @@ class SerialClient:
         self.serial_port = "/dev/ttyUSB0"
         self.serial_baudrate = 115200
         self.device_id = "esp32_1"
+        self.log_level = "WARNING"
         self.ser = None
         self.device_online = False
         self.running = False
+        self.started = False
+        self.reconnect_delay_sec = 2
+        self._loop = None
+        self._framer = LineFramer()
+        self._decoder = FrameDecoder()
+        self._listeners = []
         
-        # Handshake tracking
-        self.current_cmd = None
+        # In-flight commands keyed by msg_id (oldest first). The ESP32 runs one
+        # CMD at a time; _active_msg_id is the one it is executing, which is
+        # used for STEP_DONE/DONE frames that carry no msg_id.
+        self._cmd_lock = threading.RLock()
+        self._inflight: OrderedDict[str, DispenseCommand] = OrderedDict()
+        self._recent: OrderedDict[str, DispenseCommand] = OrderedDict()
+        self._recent_limit = 200
+        self._resolved = []
+        self._active_msg_id = None
+        self.ack_timeout_sec = 2.0
+        self.busy_retry_sec = 1.0
+        self.exec_grace_sec = 5.0
         
         # Heartbeat tracking
         self.last_heartbeat = time.time()
+        self._last_live_at = None
         self.heartbeat_timeout_sec = 13.5
         self.polling_interval_sec = 0.5
 
+        # Outgoing frames. Only the TX thread touches ser.write, so frames from the
+        # request threadpool, the read side and the timers never interleave; what
+        # is queued together goes out in one write and one flush. FIFO order keeps
+        # VERIFIED (queued on the ACK) ahead of the next CMD.
+        self._tx = deque()
+        self._tx_cond = threading.Condition()
+        self.tx_queue_max = 256
+        self.tx_batch_bytes = 4096
+        self._tx_stats = {"queued": 0, "written": 0, "writes": 0, "dropped": 0, "max_depth": 0,
+                          "last_write_ms": None, "max_write_ms": 0.0}
+
         # Load configuration
         config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
         try:
@@ -38,30 +76,102 @@ class SerialClient:
                 self.serial_port = config.get("serial_port", "/dev/ttyUSB0")
                 self.serial_baudrate = config.get("serial_baudrate", 115200)
                 self.device_id = config.get("device_id", "esp32_1")
+                self.log_level = config.get("serial_log_level", "WARNING")
         except Exception as e:
             print(f"⚠️ Could not load config.json: {e}")
+        self._configure_logging()
 
         if self.use_mock_serial:
             self.device_online = True  # Mock is always online
             print("🔧 Mock Serial Client Initialized (use_mock_serial is true)")
         else:
-            try:
-                import serial
+            # Only check that pyserial is there; it is imported when the port is opened
+            if importlib.util.find_spec("serial") is not None:
                 print(f"🔧 Real Serial Client Ready (Port: {self.serial_port}@{self.serial_baudrate})")
-            except ImportError:
+            else:
                 print("❌ pyserial not installed. Run: pip install pyserial")
                 self.use_mock_serial = True
                 self.device_online = True
 
         self.running = True
         
-        # Start serial read loop
-        self.read_thread = threading.Thread(target=self._read_serial_loop, daemon=True)
-        self.read_thread.start()
-        
         # Start heartbeat loop
         self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
         self.heartbeat_thread.start()
+        self.tx_thread = threading.Thread(target=self._tx_loop, name="serial-tx", daemon=True)
+        self.tx_thread.start()
+
+    def start(self, loop=None):
+        """
+        Start reading from the ESP32. With an asyncio loop (the FastAPI loop) the
+        port is opened non-blocking and watched with loop.add_reader, so frames are
+        handled on the event loop as soon as they arrive. Without one, fall back
+        to a blocking read thread.
+        """
+        if self.started:
+            return
+        self.started = True
+        if self.use_mock_serial:
+            return
+
+        if loop is not None and os.name == "posix":
+            self._loop = loop
+            # Open (and import pyserial) once the loop runs, so startup is not held up by the port
+            loop.call_soon(self._open_async)
+        else:
+            self.read_thread = threading.Thread(target=self._read_serial_loop, daemon=True)
+            self.read_thread.start()
+
+    # ── Event-loop transport ────────────────────────────────────────────────
+
+    def _open_async(self):
+        if not self.running:
+            return
+        try:
+            self.ser = self._open_port(timeout=0)
+            self._framer.reset()
+            self._loop.add_reader(self.ser.fileno(), self._on_readable)
+            print(f"🔌 Serial Reconnected to {self.serial_port}")
+        except Exception as e:
+            print(f"⏳ Waiting for Serial port ({e})...")
+            self._close_serial()
+            self._loop.call_later(self.reconnect_delay_sec, self._open_async)
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except Exception as e:
+            print(f"READ ERROR: {e}")
+            self._set_online(False)
+            self._close_serial()
+            self._loop.call_later(self.reconnect_delay_sec, self._open_async)
+            return
+        if data:
+            self._process_bytes(data)
+
+    def _open_port(self, timeout):
+        import serial
+        # Set DTR/RTS before opening so the ESP32 is not reset by the open itself
+        ser = serial.Serial()
+        ser.port = self.serial_port
+        ser.baudrate = self.serial_baudrate
+        ser.timeout = timeout
+        ser.dtr = False
+        ser.rts = False
+        ser.open()
+        return ser
+
+    def _close_serial(self):
+        ser, self.ser = self.ser, None
+        if ser is None:
+            return
+        if self._loop is not None:
+            try:
+                self._loop.remove_reader(ser.fileno())
+            except Exception: pass
+        try:
+            ser.close()
+        except Exception: pass
 
     def _heartbeat_loop(self):
         while self.running:
@@ -69,12 +179,12 @@ class SerialClient:
             if time.time() - self.last_heartbeat > self.heartbeat_timeout_sec:
                 if self.device_online:
                     print("⚠️ ESP32 Heartbeat timeout. Marking device OFFLINE.")
-                    self.device_online = False
-            
+                    self._set_online(False)
+
+            self._check_timeouts()
             time.sleep(self.polling_interval_sec)
 
     def _read_serial_loop(self):
-        buffer = ""
         while self.running:
             if self.use_mock_serial:
                 time.sleep(1)
@@ -82,61 +192,28 @@ class SerialClient:
                 
             try:
                 if not self.ser or not self.ser.is_open:
-                    import serial
                     try:
                         if self.ser:
                             self.ser.close()
                     except: pass
                     
                     try:
-                        self.ser = serial.Serial(self.serial_port, self.serial_baudrate, timeout=1)
-                        self.ser.dtr = False
-                        self.ser.rts = False
+                        self.ser = self._open_port(timeout=1)
                         print(f"🔌 Serial Reconnected to {self.serial_port}")
+                        self._framer.reset()
                         time.sleep(2) # ESP RESET FIX
                     except Exception as e:
                         print(f"⏳ Waiting for Serial port ({e})...")
                         time.sleep(2)
                         continue
                     
-                data = self.ser.read(self.ser.in_waiting or 1).decode(errors='ignore')
-                
-                if not data:
-                    continue
-
-                buffer += data
-
-                # Process complete lines
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-
-                    if not line:
-                        continue
-
-                    print("ESP → PI : " + line)
-
-                    # --- Auto-fix malformed JSON from ESP ---
-                    # Extract JSON object if there's garbage around it
-                    start_idx = line.find('{')
-                    end_idx = line.rfind('}')
-                    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                        line = line[start_idx:end_idx+1]
-                    
-                    # Fix unquoted keys (e.g., {type:"LIVE"} -> {"type":"LIVE"})
-                    import re
-                    line = re.sub(r'([{,])\s*([a-zA-Z0-9_]+)\s*:', r'\1"\2":', line)
-                    # ----------------------------------------
-
-                    try:
-                        parsed = json.loads(line)
-                        self._handle_response(parsed)
-                    except Exception as e:
-                        print(f"JSON ERROR → {line}")
+                data = self.ser.read(self.ser.in_waiting or 1)
+                if data:
+                    self._process_bytes(data)
 
             except Exception as e:
                 print(f"READ ERROR: {e}")
-                self.device_online = False
+                self._set_online(False)
                 try:
                     if self.ser:
                         self.ser.close()
@@ -144,67 +221,324 @@ class SerialClient:
                 self.ser = None
                 time.sleep(2)
                 
+    def _configure_logging(self):
+        # Per-frame traffic logs at DEBUG; set "serial_log_level" in config.json to see it
+        logger.setLevel(getattr(logging, str(self.log_level).upper(), logging.WARNING))
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s serial: %(message)s"))
+            logger.addHandler(handler)
+            logger.propagate = False
+
+    @property
+    def frame_stats(self) -> dict:
+        return self._decoder.stats()
+
+    def _process_bytes(self, data: bytes):
+        metrics.SERIAL_BYTES.inc(len(data), direction="rx")
+        for frame in self._framer.feed(data):
+            if not frame.strip():
+                continue
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("ESP → PI : %s", frame.decode(errors="replace").strip())
+
+            parsed = self._decoder.decode(frame)
+            if parsed is None:
+                logger.warning("JSON ERROR → %r", frame[:120])
+                metrics.SERIAL_FRAMES.inc(direction="rx", type="invalid")
+                continue
+            metrics.SERIAL_FRAMES.inc(direction="rx", type=str(parsed.get("type")))
+            try:
+                self._handle_response(parsed)
+            except Exception:
+                logger.exception("Error handling %s frame", parsed.get("type"))
+
+    # ── Event listeners ─────────────────────────────────────────────────────
+
+    def add_listener(self, callback):
+        """callback(event: str, data: dict) — called for device, heartbeat, pour and command events."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _emit(self, event: str, data: dict):
+        for callback in self._listeners:
+            try:
+                callback(event, data)
+            except Exception:
+                logger.exception("Serial event listener failed")
+
+    def _set_online(self, online: bool):
+        if self.device_online == online:
+            return
+        self.device_online = online
+        self._emit("device", {"online": online})
+
+    # ── Command tracking ────────────────────────────────────────────────────
+
+    def dispatch(self, jobs: list, msg_id: str | None = None) -> DispenseCommand:
+        """Send a CMD and track it until DONE/ERROR/DISCARDED/TIMEOUT."""
+        cmd = DispenseCommand(jobs, msg_id)
+        with self._cmd_lock:
+            self._inflight[cmd.msg_id] = cmd
+            self._transmit(cmd)
+        return cmd
+
+    def get_command(self, msg_id: str) -> DispenseCommand | None:
+        with self._cmd_lock:
+            return self._inflight.get(msg_id) or self._recent.get(msg_id)
+
+    def inflight_commands(self) -> list[DispenseCommand]:
+        with self._cmd_lock:
+            return list(self._inflight.values())
+
+    def _transmit(self, cmd: DispenseCommand):
+        cmd.attempts += 1
+        cmd.state = commands.SENT
+        cmd.sent_at = time.time()
+        cmd.retry_at = None
+        self.send(cmd.payload)
+
+    def _find_command(self, resp, states=None) -> DispenseCommand | None:
+        msg_id = resp.get("msg_id")
+        if msg_id is not None:
+            return self._inflight.get(str(msg_id))
+        cmd = self._inflight.get(self._active_msg_id) if self._active_msg_id else None
+        if cmd is None:
+            cmd = next((c for c in self._inflight.values() if not states or c.state in states), None)
+        return cmd
+
+    def _finish(self, cmd: DispenseCommand, state: str, reason: str | None = None):
+        if cmd.finished:
+            return
+        cmd.state = state
+        cmd.reason = reason
+        cmd.finished_at = time.time()
+        metrics.DISPENSE_COMMANDS.inc(status=state)
+        self._inflight.pop(cmd.msg_id, None)
+        if self._active_msg_id == cmd.msg_id:
+            self._active_msg_id = None
+        self._recent[cmd.msg_id] = cmd
+        while len(self._recent) > self._recent_limit:
+            self._recent.popitem(last=False)
+        self._resolved.append(cmd)
+        log = logger.info if state == commands.DONE else logger.warning
+        log("CMD %s finished: %s%s", cmd.msg_id, state, f" ({reason})" if reason else "")
+
+    def _resolve_finished(self):
+        # Futures are resolved outside _cmd_lock so callbacks (DB writes) never hold it
+        with self._cmd_lock:
+            resolved, self._resolved = self._resolved, []
+        for cmd in resolved:
+            if not cmd.future.done():
+                cmd.future.set_result(cmd.result())
+            self._emit("command", cmd.result())
+
+    def _check_timeouts(self):
+        now = time.time()
+        with self._cmd_lock:
+            for cmd in list(self._inflight.values()):
+                if cmd.retry_at is not None:
+                    if now >= cmd.retry_at:
+                        self._transmit(cmd)
+                    continue
+                deadline = cmd.deadline(self.ack_timeout_sec, self.exec_grace_sec)
+                if deadline is None or now < deadline:
+                    continue
+                if cmd.state == commands.SENT and cmd.attempts < cmd.max_attempts:
+                    logger.warning("No ACK for %s — resending CMD (attempt %d)", cmd.msg_id, cmd.attempts + 1)
+                    self._transmit(cmd)
+                else:
+                    self._finish(cmd, commands.TIMEOUT, f"no response while {cmd.state}")
+        self._resolve_finished()
+
     def _handle_response(self, resp):
         self.last_heartbeat = time.time()
         if not self.device_online:
             print("✅ ESP32 Activity received. Marking device ONLINE.")
-            self.device_online = True
+            self._set_online(True)
+
+        try:
+            with self._cmd_lock:
+                cmd = self._apply_response(resp)
+        finally:
+            self._resolve_finished()
+
+        rtype = resp.get("type")
+        if rtype == "LIVE":
+            self._emit("heartbeat", {"time": self.last_heartbeat})
+        else:
+            self._emit("pour", {
+                "type": rtype,
+                "msg_id": cmd.msg_id if cmd else resp.get("msg_id"),
+                "state": cmd.state if cmd else None,
+                "relay": resp.get("relay"),
+                "reason": resp.get("reason"),
+            })
 
+    def _apply_response(self, resp) -> DispenseCommand | None:
         rtype = resp.get("type")
+        cmd = None
 
         if rtype == "ACK":
-            print("ACK received")
-            if self.current_cmd and resp.get("jobs") == self.current_cmd["jobs"] and str(resp.get("msg_id")) == self.current_cmd["msg_id"]:
-                print("ACK valid → sending VERIFIED")
+            logger.debug("ACK received")
+            cmd = self._inflight.get(str(resp.get("msg_id")))
+            if cmd and resp.get("jobs") == cmd.jobs and cmd.state in (commands.SENT, commands.VERIFIED):
+                logger.info("ACK valid → sending VERIFIED")
+                cmd.state = commands.VERIFIED
+                cmd.verified_at = time.time()
+                metrics.SERIAL_ACK_RTT.observe(cmd.verified_at - cmd.sent_at)
                 verified = {
                     "type": "VERIFIED",
-                    "msg_id": self.current_cmd["msg_id"],
-                    "jobs": self.current_cmd["jobs"]
+                    "msg_id": cmd.msg_id,
+                    "jobs": cmd.jobs
                 }
                 self.send(verified)
             else:
-                print("ACK INVALID → sending ERROR")
+                logger.warning("ACK INVALID → sending ERROR")
                 error = {
                     "type": "ERROR",
-                    "msg_id": resp.get("msg_id", self.current_cmd["msg_id"] if self.current_cmd else "")
+                    "msg_id": resp.get("msg_id", "")
                 }
                 self.send(error)
+                if cmd:
+                    self._finish(cmd, commands.ERROR, "ACK mismatch")
 
         elif rtype == "STARTED":
-            print("STARTED")
+            logger.info("STARTED")
+            cmd = self._find_command(resp, (commands.VERIFIED,))
+            if cmd and cmd.state != commands.RUNNING:
+                cmd.state = commands.RUNNING
+                cmd.started_at = time.time()
+                self._active_msg_id = cmd.msg_id
 
         elif rtype == "STEP_DONE":
-            print(f"STEP DONE Relay {resp.get('relay')}")
+            logger.info("STEP DONE Relay %s", resp.get("relay"))
+            cmd = self._find_command(resp, (commands.RUNNING,))
+            if cmd:
+                cmd.relays_done.append(resp.get("relay"))
 
         elif rtype == "DONE":
-            print("DONE")
+            logger.info("DONE")
+            cmd = self._find_command(resp, (commands.RUNNING,))
+            if cmd:
+                self._finish(cmd, commands.DONE)
 
         elif rtype == "DISCARDED":
-            print("DISCARDED")
+            logger.warning("DISCARDED")
+            cmd = self._find_command(resp, (commands.VERIFIED, commands.SENT))
+            if cmd:
+                self._finish(cmd, commands.DISCARDED, "VERIFIED not received in time")
 
         elif rtype == "ERROR":
-            print(f"ERROR: {resp.get('reason')}")
+            logger.warning("ERROR: %s", resp.get("reason"))
+            cmd = self._find_command(resp)
+            if cmd:
+                self._finish(cmd, commands.ERROR, resp.get("reason", "unknown"))
+
+        elif rtype == "BUSY":
+            logger.warning("BUSY")
+            cmd = self._find_command(resp, (commands.SENT,))
+            if cmd and cmd.state == commands.SENT:
+                if cmd.attempts < cmd.max_attempts:
+                    cmd.retry_at = time.time() + self.busy_retry_sec
+                else:
+                    self._finish(cmd, commands.ERROR, "device busy")
 
         elif rtype == "LIVE":
-            print("HEARTBEAT")
+            logger.debug("HEARTBEAT")
+            now = time.time()
+            if self._last_live_at is not None:
+                metrics.SERIAL_HEARTBEAT_GAP.observe(now - self._last_live_at)
+            self._last_live_at = now
 
-    def send(self, payload):
-        """Used internally for handshake responses or directly by external services for CMD."""
-        if payload.get("type") == "CMD":
-            self.current_cmd = payload
-            
+        return cmd
+
+    def send(self, payload) -> bool:
+        """Queue one frame for the ESP32; the TX thread writes it. Use dispatch() for CMDs that should be tracked."""
         payload_str = json.dumps(payload)
-        
-        if not self.use_mock_serial and self.ser and self.ser.is_open:
-            try:
-                print(f"📡 PI → ESP : {payload_str}")
-                self.ser.write((payload_str + "\n").encode("utf-8"))
-                self.ser.flush()
-            except Exception as e:
-                print(f"❌ Serial send failed: {e}")
-        else:
-            print(f"📡 SERIAL MOCK SEND: {payload_str}")
-            # Mock immediately sending ACK and STARTED if it's a CMD
-            if self.use_mock_serial and payload.get("type") == "CMD":
-                threading.Timer(0.1, lambda: self._handle_response({"type": "ACK", "msg_id": payload.get("msg_id"), "jobs": payload.get("jobs")})).start()
-                threading.Timer(0.5, lambda: self._handle_response({"type": "STARTED", "msg_id": payload.get("msg_id")})).start()
+
+        if self.use_mock_serial or not (self.ser and self.ser.is_open):
+            logger.debug("SERIAL MOCK SEND: %s", payload_str)
+            if self.use_mock_serial:
+                self._mock_reply(payload)
+            return False
+
+        logger.debug("PI → ESP : %s", payload_str)
+        frame = (payload_str + "\n").encode("utf-8")
+        with self._tx_cond:
+            if len(self._tx) >= self.tx_queue_max:
+                self._tx_stats["dropped"] += 1
+                metrics.SERIAL_TX_DROPPED.inc()
+                logger.warning("Serial TX queue full (%d), dropping %s frame", self.tx_queue_max, payload.get("type"))
+                return False
+            self._tx.append((frame, str(payload.get("type"))))
+            depth = len(self._tx)
+            self._tx_stats["queued"] += 1
+            self._tx_stats["max_depth"] = max(self._tx_stats["max_depth"], depth)
+            self._tx_cond.notify()
+        metrics.SERIAL_TX_QUEUE.set(depth)
+        return True
+
+    # ── TX thread ───────────────────────────────────────────────────────────
+
+    def _tx_loop(self):
+        while self.running:
+            with self._tx_cond:
+                while not self._tx and self.running:
+                    self._tx_cond.wait(1.0)
+                batch, size = [], 0
+                while self._tx and (not batch or size + len(self._tx[0][0]) <= self.tx_batch_bytes):
+                    batch.append(self._tx.popleft())
+                    size += len(batch[-1][0])
+                depth = len(self._tx)
+            metrics.SERIAL_TX_QUEUE.set(depth)
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: list):
+        ser = self.ser
+        if ser is None or not ser.is_open:
+            logger.warning("Serial port closed, dropping %d queued frame(s)", len(batch))
+            return
+        data = b"".join(frame for frame, _ in batch)
+        started = time.perf_counter()
+        try:
+            ser.write(data)
+            ser.flush()
+        except Exception as e:
+            print(f"❌ Serial send failed: {e}")
+            return
+        elapsed = time.perf_counter() - started
+
+        metrics.SERIAL_WRITE_LATENCY.observe(elapsed)
+        metrics.SERIAL_WRITE_FRAMES.observe(len(batch))
+        metrics.SERIAL_BYTES.inc(len(data), direction="tx")
+        for _, frame_type in batch:
+            metrics.SERIAL_FRAMES.inc(direction="tx", type=frame_type)
+        with self._tx_cond:
+            stats = self._tx_stats
+            stats["written"] += len(batch)
+            stats["writes"] += 1
+            stats["last_write_ms"] = round(elapsed * 1000, 3)
+            stats["max_write_ms"] = max(stats["max_write_ms"], stats["last_write_ms"])
+
+    @property
+    def tx_stats(self) -> dict:
+        with self._tx_cond:
+            stats = dict(self._tx_stats, depth=len(self._tx), capacity=self.tx_queue_max)
+        stats["frames_per_write"] = round(stats["written"] / stats["writes"], 2) if stats["writes"] else None
+        return stats
+
+    def _mock_reply(self, payload):
+        # Mock firmware: ACK a CMD, then run the verified jobs in parallel
+        msg_id = payload.get("msg_id")
+        if payload.get("type") == "CMD":
+            threading.Timer(0.1, lambda: self._handle_response({"type": "ACK", "msg_id": msg_id, "jobs": payload.get("jobs")})).start()
+        elif payload.get("type") == "VERIFIED":
+            jobs = payload.get("jobs") or []
+            threading.Timer(0.1, lambda: self._handle_response({"type": "STARTED", "msg_id": msg_id})).start()
+            for job in jobs:
+                relay = job.get("relay")
+                threading.Timer(0.1 + float(job.get("duration", 0)), lambda relay=relay: self._handle_response({"type": "STEP_DONE", "relay": relay})).start()
+            longest = max((float(j.get("duration", 0)) for j in jobs), default=0.0)
+            threading.Timer(0.2 + longest, lambda: self._handle_response({"type": "DONE", "msg_id": msg_id})).start()
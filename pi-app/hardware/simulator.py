@@ -0,0 +1,368 @@
+"""
+hardware/simulator.py — ESP32 firmware simulator on a pseudo-terminal
+=====================================================================
+Implements the dispenser firmware's side of the serial protocol (see the
+notes at the top of test.py) behind a Linux pty, so the real pyserial path
+in SerialClient can be driven without hardware:
+
+  CMD       → ACK (echoes msg_id and jobs), then waits CMD_TIMEOUT for VERIFIED
+              → DISCARDED if it doesn't come
+  VERIFIED  → STARTED, all relays in parallel, STEP_DONE per relay as its
+              duration expires, DONE after the longest one
+              → ERROR (MAX_EXEC_TIME) if a pour would run past the limit
+  CMD while another is waiting/running → BUSY (a repeat of the same msg_id
+              is answered again instead, like the firmware does for lost ACKs)
+  LIVE every HEARTBEAT_SEC
+
+Faults are injected on the wire: per-frame latency with jitter (order is
+preserved, as on a real UART), dropped frames in either direction and
+corrupted bytes on frames sent to the Pi.
+
+Usage (from pi-app/):
+  python -m hardware.simulator                       # print the pty path and serve
+  python -m hardware.simulator --soak 2000 --duration-scale 0.01 --drop 0.01 --corrupt 0.01
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import selectors
+import threading
+import time
+import tty
+from hardware.framing import LineFramer
+
+CMD_TIMEOUT_SEC = 5.0
+MAX_EXEC_TIME_SEC = 20.0
+HEARTBEAT_SEC = 12.0
+
+IDLE = "IDLE"
+WAITING_VERIFIED = "WAITING_VERIFIED"
+IN_PROGRESS = "IN_PROGRESS"
+
+
+class FirmwareSimulator:
+    def __init__(self, latency_ms: float = 2.0, jitter_ms: float = 0.0, drop_rate: float = 0.0,
+                 rx_drop_rate: float = 0.0, corrupt_rate: float = 0.0, duration_scale: float = 1.0,
+                 cmd_timeout_sec: float = CMD_TIMEOUT_SEC, max_exec_sec: float = MAX_EXEC_TIME_SEC,
+                 heartbeat_sec: float = HEARTBEAT_SEC, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate            # frames to the Pi that never arrive
+        self.rx_drop_rate = rx_drop_rate      # frames from the Pi the firmware never sees
+        self.corrupt_rate = corrupt_rate      # frames to the Pi with a damaged byte
+        self.duration_scale = duration_scale  # < 1 speeds pours up for soak tests
+        self.cmd_timeout_sec = cmd_timeout_sec
+        self.max_exec_sec = max_exec_sec
+        self.heartbeat_sec = heartbeat_sec
+        self._rng = random.Random(seed)
+
+        self.state = IDLE
+        self.current = None           # {"msg_id", "jobs"} of the CMD being handled
+        self._generation = 0          # invalidates timers of a finished CMD
+        self._timers = []             # heap of (when, seq, callback)
+        self._seq = itertools.count()
+        self._last_tx_at = 0.0
+        self._framer = LineFramer()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.master_fd = None
+        self.slave_fd = None
+        self.port = None
+        self.stats = {
+            "rx_frames": 0, "rx_dropped": 0, "rx_malformed": 0,
+            "tx_frames": 0, "tx_dropped": 0, "tx_corrupted": 0,
+            "cmds": 0, "acks": 0, "busy": 0, "started": 0, "done": 0,
+            "discarded": 0, "errors": 0,
+        }
+
+    # ── Lifecycle ───────────────────────────────────────────────────────────
+
+    def open(self) -> str:
+        """Create the pty and return the device path to give to SerialClient."""
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        tty.setraw(self.master_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+        return self.port
+
+    def start(self) -> str:
+        if self.master_fd is None:
+            self.open()
+        self._running = True
+        self._schedule(self.heartbeat_sec, self._heartbeat)
+        self._thread = threading.Thread(target=self._run, name="esp32-sim", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(2)
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master_fd = self.slave_fd = None
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.master_fd, selectors.EVENT_READ)
+        while self._running:
+            with self._lock:
+                timeout = max(0.0, self._timers[0][0] - time.monotonic()) if self._timers else 0.5
+            for _ in selector.select(min(timeout, 0.5)):
+                try:
+                    data = os.read(self.master_fd, 4096)
+                except (BlockingIOError, OSError):
+                    data = b""
+                for frame in self._framer.feed(data):
+                    self._receive(frame)
+            self._fire_due()
+        selector.close()
+
+    # ── Timers ──────────────────────────────────────────────────────────────
+
+    def _schedule(self, delay: float, callback):
+        with self._lock:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._seq), callback))
+
+    def _fire_due(self):
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > time.monotonic():
+                    return
+                _, _, callback = heapq.heappop(self._timers)
+            callback()
+
+    def _guarded(self, callback):
+        # Timer that only fires if the CMD it belongs to is still the current one
+        generation = self._generation
+        return lambda: callback() if generation == self._generation else None
+
+    # ── Wire ────────────────────────────────────────────────────────────────
+
+    def _send(self, frame: dict):
+        if self._rng.random() < self.drop_rate:
+            self.stats["tx_dropped"] += 1
+            return
+        data = json.dumps(frame, separators=(",", ":")).encode()
+        if self._rng.random() < self.corrupt_rate:
+            data = self._corrupt(data)
+            self.stats["tx_corrupted"] += 1
+        delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        # A UART never reorders bytes: each frame leaves no earlier than the previous one
+        when = max(time.monotonic() + delay, self._last_tx_at)
+        self._last_tx_at = when
+        self._schedule(when - time.monotonic(), lambda: self._write(data + b"\n"))
+
+    def _corrupt(self, data: bytes) -> bytes:
+        data = bytearray(data)
+        index = self._rng.randrange(len(data))
+        if self._rng.random() < 0.5:
+            data[index] ^= 1 << self._rng.randrange(7)    # bit flip
+        else:
+            del data[index:index + self._rng.randint(1, 4)]   # lost bytes
+        return bytes(data).replace(b"\n", b"")
+
+    def _write(self, data: bytes):
+        try:
+            os.write(self.master_fd, data)
+            self.stats["tx_frames"] += 1
+        except OSError:
+            pass    # nobody has the port open; the frame is lost like on a real line
+
+    def _receive(self, frame: bytes):
+        if not frame.strip():
+            return
+        if self._rng.random() < self.rx_drop_rate:
+            self.stats["rx_dropped"] += 1
+            return
+        try:
+            msg = json.loads(frame)
+        except ValueError:
+            msg = None
+        if not isinstance(msg, dict):
+            self.stats["rx_malformed"] += 1
+            return
+        self.stats["rx_frames"] += 1
+        handler = {
+            "CMD": self._on_cmd,
+            "VERIFIED": self._on_verified,
+            "ERROR": self._on_error,
+        }.get(msg.get("type"))
+        if handler:
+            handler(msg)
+
+    # ── Firmware state machine ──────────────────────────────────────────────
+
+    def _on_cmd(self, msg: dict):
+        self.stats["cmds"] += 1
+        msg_id, jobs = msg.get("msg_id"), msg.get("jobs") or []
+        if self.state != IDLE:
+            if self.current and msg_id == self.current["msg_id"]:
+                # The Pi resent a CMD we already have — our answer was lost
+                if self.state == WAITING_VERIFIED:
+                    self.stats["acks"] += 1
+                    self._send({"type": "ACK", "msg_id": msg_id, "jobs": self.current["jobs"]})
+                else:
+                    self._send({"type": "STARTED", "msg_id": msg_id})
+                return
+            self.stats["busy"] += 1
+            self._send({"type": "BUSY", "msg_id": msg_id})
+            return
+        if not jobs or not all(isinstance(j, dict) and "relay" in j and "duration" in j for j in jobs):
+            self.stats["errors"] += 1
+            self._send({"type": "ERROR", "msg_id": msg_id, "reason": "invalid jobs"})
+            return
+        self._generation += 1
+        self.current = {"msg_id": msg_id, "jobs": jobs}
+        self.state = WAITING_VERIFIED
+        self.stats["acks"] += 1
+        self._send({"type": "ACK", "msg_id": msg_id, "jobs": jobs})
+        self._schedule(self.cmd_timeout_sec, self._guarded(self._discard))
+
+    def _discard(self):
+        if self.state != WAITING_VERIFIED:
+            return
+        self.stats["discarded"] += 1
+        self._send({"type": "DISCARDED", "msg_id": self.current["msg_id"]})
+        self._reset()
+
+    def _on_verified(self, msg: dict):
+        if self.state != WAITING_VERIFIED or msg.get("msg_id") != self.current["msg_id"]:
+            if self.state == IN_PROGRESS and msg.get("msg_id") == self.current["msg_id"]:
+                self._send({"type": "STARTED", "msg_id": msg.get("msg_id")})
+            return
+        if msg.get("jobs") != self.current["jobs"]:
+            self.stats["errors"] += 1
+            self._send({"type": "ERROR", "msg_id": msg.get("msg_id"), "reason": "VERIFIED jobs mismatch"})
+            self._reset()
+            return
+
+        self._generation += 1
+        self.state = IN_PROGRESS
+        self.stats["started"] += 1
+        self._send({"type": "STARTED", "msg_id": self.current["msg_id"]})
+        longest = 0.0
+        for job in self.current["jobs"]:
+            duration = float(job["duration"]) * self.duration_scale
+            longest = max(longest, duration)
+            if duration <= self.max_exec_sec:
+                relay = job["relay"]
+                self._schedule(duration, self._guarded(lambda relay=relay: self._send({"type": "STEP_DONE", "relay": relay})))
+        if longest > self.max_exec_sec:
+            self._schedule(self.max_exec_sec, self._guarded(self._exec_timeout))
+        else:
+            self._schedule(longest, self._guarded(self._done))
+
+    def _done(self):
+        self.stats["done"] += 1
+        self._send({"type": "DONE", "msg_id": self.current["msg_id"]})
+        self._reset()
+
+    def _exec_timeout(self):
+        self.stats["errors"] += 1
+        self._send({"type": "ERROR", "msg_id": self.current["msg_id"], "reason": "MAX_EXEC_TIME"})
+        self._reset()
+
+    def _on_error(self, msg: dict):
+        # The Pi rejected our ACK — abandon the CMD
+        if self.current and msg.get("msg_id") in ("", None, self.current["msg_id"]):
+            self._reset()
+
+    def _reset(self):
+        self._generation += 1
+        self.state = IDLE
+        self.current = None
+
+    def _heartbeat(self):
+        self._send({"type": "LIVE"})
+        self._schedule(self.heartbeat_sec, self._heartbeat)
+
+
+# ── Soak test ─────────────────────────────────────────────────────────────────
+
+def soak(sim: FirmwareSimulator, count: int, relays: int = 8, max_jobs: int = 4, seed: int = 1) -> dict:
+    """Push `count` CMDs through the real SerialClient (async pyserial path), one after another."""
+    import asyncio
+    from hardware.serial_client import SerialClient
+
+    rng = random.Random(seed)
+    client = SerialClient()
+    client.use_mock_serial = False
+    client.serial_port = sim.port
+    outcomes, latencies = {}, []
+
+    async def main():
+        client.start(asyncio.get_running_loop())
+        await asyncio.sleep(0)      # let the client open the port
+        started = time.monotonic()
+        for n in range(count):
+            jobs = [{"relay": f"L{r}", "duration": round(rng.uniform(1, 8), 2)}
+                    for r in rng.sample(range(relays), rng.randint(1, max_jobs))]
+            t0 = time.monotonic()
+            result = await asyncio.wrap_future(client.dispatch(jobs).future)
+            latencies.append(time.monotonic() - t0)
+            outcomes[result["status"]] = outcomes.get(result["status"], 0) + 1
+            if (n + 1) % 100 == 0:
+                print(f"  {n + 1}/{count} {outcomes}", flush=True)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(main())
+    latencies.sort()
+    return {
+        "commands": count,
+        "elapsed_sec": round(elapsed, 2),
+        "commands_per_hour": round(count / elapsed * 3600) if elapsed else None,
+        "outcomes": outcomes,
+        "p50_sec": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        "p99_sec": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3) if latencies else None,
+        "frames": client.frame_stats,
+        "tx": client.tx_stats,
+        "simulator": dict(sim.stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hardware.simulator", description="ESP32 firmware simulator on a pty")
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0, help="probability a frame to the Pi is lost")
+    parser.add_argument("--rx-drop", type=float, default=0.0, help="probability a frame from the Pi is lost")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability a frame to the Pi is damaged")
+    parser.add_argument("--duration-scale", type=float, default=1.0, help="multiply pour durations (0.01 = 100× faster)")
+    parser.add_argument("--heartbeat-sec", type=float, default=HEARTBEAT_SEC)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--soak", type=int, default=0, metavar="N", help="drive N commands through SerialClient and report")
+    args = parser.parse_args(argv)
+
+    sim = FirmwareSimulator(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, drop_rate=args.drop,
+        rx_drop_rate=args.rx_drop, corrupt_rate=args.corrupt, duration_scale=args.duration_scale,
+        heartbeat_sec=args.heartbeat_sec, seed=args.seed,
+    )
+    port = sim.start()
+    try:
+        if args.soak:
+            print(f"🧪 Soak: {args.soak} commands via {port}")
+            print(json.dumps(soak(sim, args.soak, seed=args.seed or 1), indent=2))
+            return
+        print(f"🔌 ESP32 simulator on {port} — set \"serial_port\" in config.json to this path (Ctrl+C to stop)")
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
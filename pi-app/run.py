@@ -1,4 +1,62 @@
+"""
+Start the Mixion API.
+
+  python run.py                 one process that also owns the serial port
+  python run.py --reload        same, restarting on code changes (development)
+  python run.py --workers 4     hardware daemon + 4 stateless API workers
+
+With --workers the hardware daemon (python -m hardware.daemon) is started
+first and owns the serial port; the uvicorn workers reach it over a Unix
+socket, so they can use every core.
+"""
+
+from services import startup    # first, so the startup report counts the imports below
+import argparse
+import os
+import subprocess
+import sys
+import time
 import uvicorn
+from hardware.gateway import socket_path
+
+
+def _start_daemon(path: str, timeout_sec: float = 15.0) -> subprocess.Popen:
+    if os.path.exists(path):
+        os.unlink(path)
+    daemon = subprocess.Popen([sys.executable, "-m", "hardware.daemon", "--socket", path])
+    deadline = time.time() + timeout_sec
+    while not os.path.exists(path):
+        if daemon.poll() is not None:
+            raise SystemExit(f"❌ Hardware daemon exited with code {daemon.returncode}")
+        if time.time() > deadline:
+            daemon.terminate()
+            raise SystemExit("❌ Hardware daemon did not open its socket in time")
+        time.sleep(0.05)
+    return daemon
+
 
 if __name__ == "__main__":
-    uvicorn.run("api.app:app", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Start the Mixion API")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes (>1 starts the hardware daemon)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reload", action="store_true", help="restart on code changes (development only)")
+    args = parser.parse_args()
+    # Inherited by reload and worker processes, so their reports start from here too
+    os.environ[startup.LAUNCHED_AT_ENV] = str(startup.launched_at)
+
+    if args.reload:
+        uvicorn.run("api.app:app", host=args.host, port=args.port, reload=True)
+    elif args.workers <= 1:
+        uvicorn.run("api.app:app", host=args.host, port=args.port)
+    else:
+        path = os.path.abspath(socket_path())
+        daemon = _start_daemon(path)
+        # Inherited by the workers: route hardware calls to the daemon
+        os.environ["MIXION_HARDWARE"] = "daemon"
+        os.environ["MIXION_HARDWARE_SOCKET"] = path
+        try:
+            uvicorn.run("api.app:app", host=args.host, port=args.port, workers=args.workers)
+        finally:
+            daemon.terminate()
+            daemon.wait(10)
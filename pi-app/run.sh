@@ -37,4 +37,4 @@ echo ""
 
 # ── Step 5: Start FastAPI server ─────────────────────────────────────────────
 echo "🔥 Running FastAPI server..."
-python run.py
+python run.py --workers "${MIXION_WORKERS:-1}"
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from hardware import commands
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Orders run highest priority first; kiosk orders use 0
+MIN_PRIORITY = 0
+MAX_PRIORITY = 10
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DispenseJob:
+    """One paid order waiting for (or using) the dispenser."""
+
+    def __init__(self, drink_id: str, txn_id: int, jobs: list, bottles: list, priority: int = 0):
+        self.order_id = str(uuid.uuid4())
+        self.drink_id = drink_id
+        self.txn_id = txn_id
+        self.jobs = jobs
+        self.bottles = bottles
+        self.priority = priority
+        self.status = "queued"
+        self.msg_id = None
+        self.result = None
+        self.enqueued_at = time.time()
+        self.dispatched_at = None
+        self.seq = 0
+        self.on_done = None
+
+    @property
+    def relays(self) -> set:
+        return {j["relay"] for j in self.jobs}
+
+    @property
+    def planned_duration(self) -> float:
+        return max((float(j["duration"]) for j in self.jobs), default=0.0)
+
+    def snapshot(self) -> dict:
+        return {
+            "order_id": self.order_id,
+            "drink_id": self.drink_id,
+            "transaction_id": self.txn_id,
+            "status": self.status,
+            "msg_id": self.msg_id,
+            "priority": self.priority,
+            "jobs": self.jobs,
+            "result": self.result,
+        }
+
+
+class DispenseScheduler:
+    """
+    Feeds the single ESP32 one CMD at a time from a bounded queue.
+      - Highest priority first, FIFO within a priority.
+      - The next CMD goes out as soon as the running one finishes (DONE, error or timeout).
+      - Queued orders whose lines don't overlap are merged into one CMD; the
+        firmware runs all relays of a CMD in parallel, so they pour together.
+    """
+
+    def __init__(self, serial, max_queue: int = 20, max_batch: int = 4, overhead_sec: float = 1.5):
+        self.serial = serial
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.overhead_sec = overhead_sec    # ACK/VERIFIED/STARTED handshake per CMD
+        self._lock = threading.RLock()
+        self._pending: list[DispenseJob] = []
+        self._running: list[DispenseJob] = []
+        self._running_since = None
+        self._jobs: dict[str, DispenseJob] = {}
+        self._history_limit = 200
+        self._seq = 0
+        self._listeners = []
+        # Command futures resolve on the serial reader (the event loop in async
+        # mode). Settling writes to SQLite, so it runs here instead, in order.
+        self._settler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispense-settle")
+
+    # ── Listeners ───────────────────────────────────────────────────────────
+
+    def add_listener(self, callback):
+        """callback(event: str, data: dict) — "order" events as orders move through the queue."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _emit(self, job: DispenseJob, **extra):
+        data = {"order_id": job.order_id, "status": job.status, "msg_id": job.msg_id}
+        data.update(extra)
+        for callback in self._listeners:
+            try:
+                callback("order", data)
+            except Exception:
+                logger.exception("Scheduler event listener failed")
+
+    # ── Queue ───────────────────────────────────────────────────────────────
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.max_queue
+
+    def submit(self, job: DispenseJob, on_done=None) -> dict:
+        """Queue a job; on_done(job, result) is called once its CMD finishes."""
+        with self._lock:
+            if self.full:
+                raise QueueFull(f"Dispense queue full ({self.max_queue} orders waiting)")
+            self._seq += 1
+            job.seq = self._seq
+            job.priority = min(max(int(job.priority), MIN_PRIORITY), MAX_PRIORITY)
+            job.on_done = on_done
+            self._pending.append(job)
+            self._pending.sort(key=lambda j: (-j.priority, j.seq))
+            self._remember(job)
+        self._pump()
+        ticket = self.position(job.order_id)
+        self._emit(job, position=ticket["position"], eta_sec=ticket["eta_sec"])
+        return ticket
+
+    def get(self, order_id: str) -> DispenseJob | None:
+        return self._jobs.get(order_id)
+
+    def position(self, order_id: str) -> dict:
+        """Queue position (0 = dispensing now) and a rough ETA until the pour finishes."""
+        with self._lock:
+            remaining = 0.0
+            if self._running:
+                planned = max(j.planned_duration for j in self._running) + self.overhead_sec
+                remaining = max(0.0, planned - (time.time() - self._running_since))
+            for job in self._running:
+                if job.order_id == order_id:
+                    return {"order_id": order_id, "status": job.status, "msg_id": job.msg_id,
+                            "position": 0, "eta_sec": round(remaining, 1)}
+            eta = remaining
+            for index, job in enumerate(self._pending, start=1):
+                eta += job.planned_duration + self.overhead_sec
+                if job.order_id == order_id:
+                    return {"order_id": order_id, "status": job.status, "msg_id": None,
+                            "position": index, "eta_sec": round(eta, 1)}
+            job = self._jobs.get(order_id)
+            return {"order_id": order_id, "status": job.status if job else "unknown",
+                    "msg_id": job.msg_id if job else None, "position": None, "eta_sec": 0.0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "max_queue": self.max_queue,
+            }
+
+    def _remember(self, job: DispenseJob):
+        self._jobs[job.order_id] = job
+        while len(self._jobs) > self._history_limit + len(self._pending) + len(self._running):
+            oldest = next(iter(self._jobs))
+            if self._jobs[oldest].status in ("queued", "dispensing"):
+                break
+            del self._jobs[oldest]
+
+    # ── Dispatch ────────────────────────────────────────────────────────────
+
+    def _next_batch(self) -> list[DispenseJob]:
+        batch = [self._pending[0]]
+        lines = set(batch[0].relays)
+        for job in self._pending[1:]:
+            if len(batch) >= self.max_batch:
+                break
+            if lines.isdisjoint(job.relays):
+                batch.append(job)
+                lines |= job.relays
+        return batch
+
+    def _pump(self):
+        with self._lock:
+            if self._running or not self._pending:
+                return
+            batch = self._next_batch()
+            for job in batch:
+                self._pending.remove(job)
+            self._running = batch
+            self._running_since = time.time()
+            cmd = self.serial.dispatch([j for job in batch for j in job.jobs])
+            for job in batch:
+                job.status = "dispensing"
+                job.msg_id = cmd.msg_id
+                job.dispatched_at = self._running_since
+        for job in batch:
+            self._emit(job, position=0)
+        cmd.future.add_done_callback(lambda f: self._settler.submit(self._settle, batch, f.result()))
+
+    def _settle(self, batch: list[DispenseJob], result: dict):
+        try:
+            self._finished(batch, result)
+        except Exception:
+            logger.exception("Finishing CMD %s failed", result.get("msg_id"))
+
+    def _finished(self, batch: list[DispenseJob], result: dict):
+        with self._lock:
+            if self._running is batch:
+                self._running = []
+                self._running_since = None
+        for job in batch:
+            job.status = "completed" if result["status"] == commands.DONE else "failed"
+            job.result = result
+            metrics.ORDERS.inc(status=job.status)
+            if job.on_done:
+                try:
+                    job.on_done(job, result)
+                except Exception:
+                    logger.exception("Settling order %s failed", job.order_id)
+            self._emit(job, reason=result.get("reason"))
+        # Start the next CMD the moment this one is finished
+        self._pump()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+
+class EventBroadcaster:
+    """
+    Fans events out to every connected /api/events client.
+    publish() is safe to call from any thread; messages are serialized once
+    and delivered on the event loop. Each client has a bounded queue — a client
+    that falls behind loses its oldest messages instead of growing memory.
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._loop = None
+        self._clients: set[asyncio.Queue] = set()
+        self._seq = 0
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def attach(self, loop):
+        self._loop = loop
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    def publish(self, event: str, data: dict):
+        loop = self._loop
+        if loop is None or not self._clients:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(event, data)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, event, data)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    def format(self, event: str, data: dict) -> str:
+        self._seq += 1
+        return f"id: {self._seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def _deliver(self, event: str, data: dict):
+        if not self._clients:
+            return
+        message = self.format(event, data)
+        for queue in list(self._clients):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+
+
+broadcaster = EventBroadcaster()
@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from db.database import Database
+from db.repositories.inventory_repo import InventoryRepository
+
+# (label, hours); the shortest window with any consumption drives the forecast
+WINDOWS = (("24h", 24), ("7d", 7 * 24), ("30d", 30 * 24))
+
+
+class ForecastService:
+    """
+    Predicts when each bottle runs dry from how fast it has been poured.
+
+    Consumption per bottle and window comes from one aggregate query over
+    sales_rollup × recipes, so the cost is the same for 5 bottles or 500 and
+    independent of the transaction log size. Between full rebuilds (every
+    refresh_sec, or after any menu change) the cache is updated incrementally:
+    inventory events only re-read the levels of the bottles that changed and
+    add the drop in level to the window totals.
+    """
+
+    def __init__(self, db: Database | None = None, refresh_sec: float = 300):
+        self.repo = InventoryRepository(db or Database.shared())
+        self.refresh_sec = refresh_sec
+        self._lock = threading.Lock()
+        self._bottles: dict[int, dict] = {}
+        self._usage: dict[int, dict] = {}
+        self._drinks: dict[int, list] = {}
+        self._spans: dict[str, float] = {}
+        self._built_at = 0.0
+        self._stale = True
+        self._dirty: set = set()
+        Database.add_change_listener(self.on_change)
+
+    def on_change(self, event: str, data: dict):
+        # Runs on the writer's thread right after commit — only mark what changed
+        with self._lock:
+            if event == "inventory":
+                self._dirty.update(data.get("bottles", ()))
+            elif event == "menu":
+                self._stale = True
+
+    # ── Cache ───────────────────────────────────────────────────────────────
+
+    def _rebuild(self):
+        now = datetime.now()
+        since = {}
+        for label, hours in WINDOWS:
+            start = (now - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+            since[label] = start
+        usage = self.repo.consumption_by_bottle([since[label].isoformat()[:13] for label, _ in WINDOWS])
+        self._usage = {
+            bid: {
+                "ml": dict(zip((label for label, _ in WINDOWS), u["ml"])),
+                "ml_per_pour": u["ml"][-1] / u["pours"] if u["pours"] else None,
+            }
+            for bid, u in usage.items()
+        }
+        self._bottles = {b["id"]: b for b in self.repo.bottles()}
+        self._drinks = self.repo.drinks_by_bottle()
+        # Hour buckets are whole hours, so each window really starts at its bucket boundary
+        self._spans = {label: (now - start).total_seconds() / 3600 for label, start in since.items()}
+        self._built_at = time.time()
+        self._stale = False
+        self._dirty.clear()
+
+    def _apply_dirty(self):
+        levels = self.repo.levels(self._dirty)
+        for bid, level in levels.items():
+            bottle = self._bottles.get(bid)
+            if bottle is None:
+                continue
+            poured = (bottle["current_ml"] or 0) - (level or 0)
+            bottle["current_ml"] = level
+            if poured > 0:
+                # Refills and returned reservations go up and are not consumption
+                usage = self._usage.setdefault(bid, {"ml": {label: 0.0 for label, _ in WINDOWS}, "ml_per_pour": None})
+                for label in usage["ml"]:
+                    usage["ml"][label] += poured
+        self._dirty.clear()
+
+    def _refresh(self):
+        if self._stale or time.time() - self._built_at > self.refresh_sec:
+            self._rebuild()
+        elif self._dirty:
+            self._apply_dirty()
+
+    # ── Forecast ────────────────────────────────────────────────────────────
+
+    def forecast(self) -> dict:
+        with self._lock:
+            self._refresh()
+            now = datetime.now()
+            elapsed_h = (time.time() - self._built_at) / 3600
+            bottles = [self._bottle_forecast(b, now, elapsed_h) for b in self._bottles.values()]
+            built_at = self._built_at
+        bottles.sort(key=lambda b: (b["hours_to_empty"] is None, b["hours_to_empty"] or 0))
+        return {
+            "generated_at": now.isoformat(),
+            "rates_built_at": datetime.fromtimestamp(built_at).isoformat(),
+            "windows": [label for label, _ in WINDOWS],
+            "bottles": bottles,
+        }
+
+    def _bottle_forecast(self, bottle: dict, now: datetime, elapsed_h: float) -> dict:
+        current = max(0.0, bottle["current_ml"] or 0.0)
+        usage = self._usage.get(bottle["id"], {"ml": {}, "ml_per_pour": None})
+        rates = {
+            label: round(usage["ml"].get(label, 0.0) / (self._spans[label] + elapsed_h), 3)
+            for label, _ in WINDOWS
+        }
+        rate = next((rates[label] for label, _ in WINDOWS if rates[label] > 0), 0.0)
+        hours_to_empty = round(current / rate, 2) if rate > 0 else None
+
+        drinks = [
+            {**d, "remaining": math.floor(current / d["amount_ml"])}
+            for d in self._drinks.get(bottle["id"], [])
+        ]
+        # Average pour over the longest window; the plain recipe average until it has history
+        ml_per_pour = usage["ml_per_pour"]
+        if ml_per_pour is None and drinks:
+            ml_per_pour = sum(d["amount_ml"] for d in drinks) / len(drinks)
+        return {
+            "bottle_id": bottle["id"],
+            "ingredient_name": bottle["ingredient_name"],
+            "line_name": bottle["line_name"],
+            "enabled": bool(bottle["enabled"]),
+            "capacity_ml": bottle["capacity_ml"],
+            "current_ml": current,
+            "rate_ml_per_hour": rates,
+            "hours_to_empty": hours_to_empty,
+            "empty_at": (now + timedelta(hours=hours_to_empty)).isoformat() if hours_to_empty is not None else None,
+            "pours_remaining": math.floor(current / ml_per_pour) if ml_per_pour else None,
+            "drinks": drinks,
+        }
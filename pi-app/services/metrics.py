@@ -0,0 +1,261 @@
+"""
+In-process metrics registry, rendered in the Prometheus text format at /metrics.
+
+Recording is a dict lookup plus a few additions under a per-metric lock
+(a couple of microseconds), so it stays on in production. Histograms keep one count
+per bucket and are made cumulative only when scraped. Gauges can be backed by
+a function that is evaluated at scrape time instead of being kept up to date.
+"""
+
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds: sub-millisecond DB calls up to multi-second pours
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Read the value at scrape time; function() returns a number or {label value: number}."""
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            if isinstance(value, dict):
+                return [f"{self.name}{_labels(self.labelnames, (k,))} {_number(v)}" for k, v in value.items()]
+            return [f"{self.name} {_number(value)}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}    # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ── HTTP ──────────────────────────────────────────────────────────────────────
+HTTP_LATENCY = registry.histogram(
+    "mixion_http_request_duration_seconds", "Time to response start per route", ("method", "route"))
+HTTP_REQUESTS = registry.counter(
+    "mixion_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+
+# ── Database ──────────────────────────────────────────────────────────────────
+DB_CALL_LATENCY = registry.histogram(
+    "mixion_db_call_duration_seconds", "Database method call time, including writer lock wait", ("method",))
+DB_COMMITS = registry.counter("mixion_db_commits_total", "Commits on the writer connection")
+DB_ROLLBACKS = registry.counter("mixion_db_rollbacks_total", "Rollbacks on the writer connection")
+
+# ── Serial ────────────────────────────────────────────────────────────────────
+SERIAL_BYTES = registry.counter("mixion_serial_bytes_total", "Bytes on the ESP32 serial line", ("direction",))
+SERIAL_FRAMES = registry.counter(
+    "mixion_serial_frames_total", "Frames on the ESP32 serial line by type", ("direction", "type"))
+SERIAL_ACK_RTT = registry.histogram(
+    "mixion_serial_ack_rtt_seconds", "CMD sent → valid ACK received",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0))
+SERIAL_HEARTBEAT_GAP = registry.histogram(
+    "mixion_serial_heartbeat_gap_seconds", "Time between consecutive LIVE frames",
+    buckets=(1, 5, 10, 11, 12, 12.5, 13, 13.5, 15, 20, 30, 60))
+SERIAL_TX_QUEUE = registry.gauge("mixion_serial_tx_queue_depth", "Frames waiting for the serial writer thread")
+SERIAL_TX_DROPPED = registry.counter("mixion_serial_tx_dropped_total", "Frames dropped because the TX queue was full")
+SERIAL_WRITE_LATENCY = registry.histogram(
+    "mixion_serial_write_seconds", "One coalesced write + flush on the serial port",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+SERIAL_WRITE_FRAMES = registry.histogram(
+    "mixion_serial_write_frames", "Frames coalesced into one serial write", buckets=(1, 2, 3, 4, 8, 16, 32, 64))
+DEVICE_ONLINE = registry.gauge("mixion_device_online", "1 while the ESP32 is considered online")
+
+# ── Dispensing ────────────────────────────────────────────────────────────────
+DISPENSE_COMMANDS = registry.counter(
+    "mixion_dispense_commands_total", "Finished ESP32 commands by final state", ("status",))
+ORDERS = registry.counter("mixion_orders_total", "Finished orders by status", ("status",))
+QUEUE_DEPTH = registry.gauge("mixion_dispense_queue_depth", "Orders by scheduler state", ("state",))
+INFLIGHT_COMMANDS = registry.gauge("mixion_serial_inflight_commands", "CMDs awaiting a final state")
+EVENT_CLIENTS = registry.gauge("mixion_event_clients", "Connected /api/events clients")
+STARTUP_SECONDS = registry.gauge("mixion_startup_seconds", "Time from launch to serving, by phase", ("phase",))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware), so SSE streams pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                HTTP_LATENCY.observe(time.perf_counter() - start, method=scope["method"], route=_route(scope))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS.inc(method=scope["method"], route=_route(scope), status=status)
+
+
+def _route(scope) -> str:
+    # Route templates keep the label set bounded (/api/order/{order_id}, not every id).
+    # Rebuilt from the matched path params, which works for routes in included routers too.
+    if scope.get("path", "").startswith("/static/"):
+        return "/static"
+    if "endpoint" not in scope:
+        return "unmatched"
+    params = {str(v): k for k, v in scope.get("path_params", {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join("{" + params[seg] + "}" if seg in params else seg for seg in scope["path"].split("/"))
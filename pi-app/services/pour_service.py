@@ -1,10 +1,29 @@
-import uuid
+import threading
+from typing import NamedTuple
 from fastapi import HTTPException
+from hardware import commands
+from services.dispense_scheduler import DispenseJob, DispenseScheduler, QueueFull
+
+
+class PourPlan(NamedTuple):
+    """Everything an order for one drink needs, compiled once from recipes, bottles and lines."""
+    drink_id: str
+    jobs: tuple        # ({"relay", "duration"}, ...) with line calibration applied
+    bottles: tuple     # ({"id", "name", "line_name", "amount_ml", ...}, ...) to deduct
+    problem: str | None = None   # why the drink cannot be poured, independent of stock levels
+
 
 class PourService:
-    def __init__(self, db, serial_client):
+    def __init__(self, db, serial_client, scheduler=None):
         self.db = db
         self.serial = serial_client
+        self.scheduler = scheduler or DispenseScheduler(serial_client)
+        self._plans: dict[str, PourPlan] = {}
+        self._plans_lock = threading.Lock()
+        self._plans_generation = 0
+        self.plan_hits = 0
+        self.plan_misses = 0
+        db.add_pour_plan_listener(self.invalidate_plans)
 
     def calculate_duration(self, amount_ml, flow_rate):
         duration = (amount_ml / flow_rate) + 0.3
@@ -21,8 +40,9 @@ class PourService:
         # Ensure final amount is never negative
         return max(0.0, adjusted)
 
-    def prepare_jobs(self, drink_id):
-        bottles = self.db.get_recipe_bottles(drink_id)
+    def prepare_jobs(self, drink_id, bottles=None):
+        if bottles is None:
+            bottles = self.db.get_recipe_bottles(drink_id)
         if not bottles:
             raise HTTPException(status_code=404, detail="No recipe found for this drink, or missing physical bottles")
 
@@ -42,37 +62,117 @@ class PourService:
             jobs.append({"relay": b["line_name"], "duration": duration})
         return jobs
 
-    def dispense(self, drink_id):
-        # 1. Pre-flight availability check
-        available, reason = self.db.check_drink_availability(drink_id, device_online=self.serial.device_online)
-        if not available:
-            raise HTTPException(status_code=409, detail=f"Drink unavailable: {reason}")
+    # ── Pour plans ──────────────────────────────────────────────────────────
+    # Compiled on the first order for a drink and reused until the Database
+    # reports a change to that drink's recipe, bottles or lines.
 
-        # 3. Build hardware jobs
-        jobs = self.prepare_jobs(drink_id)
-        msg_id = str(uuid.uuid4())
+    def invalidate_plans(self, drink_ids=None):
+        with self._plans_lock:
+            self._plans_generation += 1
+            if drink_ids is None:
+                self._plans.clear()
+            else:
+                for drink_id in drink_ids:
+                    self._plans.pop(drink_id, None)
 
-        # 4. Create transaction record (status=started)
-        txn_id = self.db.create_transaction(drink_id)
+    def plan_for(self, drink_id) -> PourPlan | None:
+        """The cached plan for a drink, compiling it on a miss. None if the drink does not exist."""
+        plan = self._plans.get(drink_id)
+        if plan is not None:
+            self.plan_hits += 1
+            return plan
+        self.plan_misses += 1
+        generation = self._plans_generation
+        plan = self.compile_plan(drink_id)
+        with self._plans_lock:
+            # An admin change landed while compiling; don't cache what may be stale
+            if plan is not None and generation == self._plans_generation:
+                self._plans[drink_id] = plan
+        return plan
 
-        # 5. Publish to hardware
-        payload = {
-            "type": "CMD",
-            "msg_id": msg_id,
-            "jobs": jobs
-        }
-        self.serial.send(payload)
+    def compile_plan(self, drink_id) -> PourPlan | None:
+        rows = self.db.get_pour_plan_rows(drink_id)
+        if not rows:
+            return None
+        problem = self._plan_problem(rows)
+        if problem:
+            return PourPlan(drink_id, (), (), problem)
+        bottles = tuple({
+            "id": row["bottle_id"],
+            "name": row["ingredient_name"],
+            "line_name": row["line_name"],
+            "flow_rate": row["flow_rate"],
+            "enabled": row["bottle_enabled"],
+            "amount_ml": row["amount_ml"],
+            "calibration_type": row["calibration_type"],
+            "calibration_value": row["calibration_value"],
+        } for row in rows)
+        return PourPlan(drink_id, tuple(self.prepare_jobs(drink_id, bottles=bottles)), bottles)
+
+    @staticmethod
+    def _plan_problem(rows) -> str | None:
+        if not rows[0]["drink_enabled"]:
+            return "Drink disabled"
+        if rows[0]["amount_ml"] is None:
+            return "No recipe defined"
+        for row in rows:
+            if row["ingredient_name"] is None:
+                return "Recipe uses a deleted ingredient"
+            if not row["bottle_id"]:
+                return f"Missing bottle for {row['ingredient_name']}"
+            if not row["bottle_enabled"]:
+                return f"Bottle for {row['ingredient_name']} is disabled"
+            if row["line_name"] is None:
+                return f"Missing line for {row['ingredient_name']}"
+        return None
+
+    def plan_stats(self) -> dict:
+        return {"cached": len(self._plans), "hits": self.plan_hits, "misses": self.plan_misses}
+
+    # ── Dispensing ──────────────────────────────────────────────────────────
 
-        # 6. Deduct inventory immediately (optimistic — hardware is fire-and-forget)
+    def dispense(self, drink_id, priority: int = 0):
+        # 0. Admission control — refuse before reserving anything
+        if self.scheduler.full:
+            raise HTTPException(status_code=503, detail="Dispenser busy, please try again shortly")
+        if not self.serial.device_online:
+            raise HTTPException(status_code=409, detail="Drink unavailable: Hardware Offline")
+
+        # 1. Relays, durations and bottle deltas come precompiled — no recipe queries
+        plan = self.plan_for(drink_id)
+        if plan is None or plan.problem:
+            reason = plan.problem if plan else "Drink disabled"
+            raise HTTPException(status_code=409, detail=f"Drink unavailable: {reason}")
+
+        # 2. Reserve stock and record the transaction (status=started) in one commit
+        available, reason, txn_id = self.db.reserve_plan(drink_id, plan.bottles, status="started")
+        if not available:
+            raise HTTPException(status_code=409, detail=f"Drink unavailable: {reason}")
+
+        # 3. Queue for the dispenser; the transaction is settled by the ESP32's answer
+        bottles = list(plan.bottles)
+        job = DispenseJob(drink_id, txn_id, [dict(j) for j in plan.jobs], bottles, priority)
         try:
-            self.db.deduct_bottles(drink_id)
-            self.db.complete_transaction(txn_id, "completed")
-        except Exception as e:
-            self.db.complete_transaction(txn_id, "failed")
-            raise HTTPException(status_code=500, detail=f"Inventory update failed: {e}")
+            ticket = self.scheduler.submit(job, on_done=self._settle)
+        except QueueFull:
+            self.db.release_reservation(txn_id, bottles)
+            raise HTTPException(status_code=503, detail="Dispenser busy, please try again shortly")
 
         return {
-            "status": "started",
-            "msg_id": msg_id,
-            "transaction_id": txn_id
+            "status": "started" if ticket["position"] == 0 else "queued",
+            "order_id": job.order_id,
+            "msg_id": ticket["msg_id"],
+            "transaction_id": txn_id,
+            "position": ticket["position"],
+            "eta_sec": ticket["eta_sec"],
         }
+
+    def _settle(self, job, result):
+        if result["status"] == commands.DONE:
+            self.db.complete_transaction(job.txn_id, "completed")
+        elif not result["started"]:
+            # Nothing was poured — put the reserved stock back
+            self.db.release_reservation(job.txn_id, job.bottles, "failed")
+        else:
+            # Relays ran at least partly; the stock is gone but the pour failed
+            self.db.complete_transaction(job.txn_id, "error")
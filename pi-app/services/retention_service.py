@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from db.database import Database
+from db.repositories.log_repo import TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionService:
+    """
+    Keeps the live transactions table small on the Pi's SD card. Once a day,
+    transactions older than transaction_retention_days are moved into
+    compressed batches in transactions_archive. Each batch is its own short
+    write transaction with a pause in between, so a pour never waits behind a
+    long DELETE.
+    """
+
+    def __init__(self, db: Database | None = None, config_path: str | None = None):
+        self.archive = TransactionArchive(db or Database.shared())
+        self.retention_days = 0
+        self.batch_size = 500
+        self.pause_sec = 0.05
+        self.interval_sec = 24 * 3600
+
+        config_path = config_path or os.path.join(os.path.dirname(__file__), "..", "config.json")
+        try:
+            with open(config_path, "r") as f:
+                config = json.load(f)
+                self.retention_days = int(config.get("transaction_retention_days", 0))
+        except Exception as e:
+            print(f"⚠️ Could not load config.json: {e}")
+
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="txn-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # First pass shortly after boot, then daily
+        if self._stop.wait(60):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once(self.retention_days)
+            except Exception:
+                logger.exception("Transaction archival failed")
+            self._stop.wait(self.interval_sec)
+
+    def run_once(self, older_than_days: int) -> dict:
+        """Archive everything older than older_than_days, batch by batch."""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        started = time.perf_counter()
+        moved = batches = 0
+        with self._lock:    # one archival pass at a time
+            while not self._stop.is_set():
+                count = self.archive.archive_batch(cutoff, self.batch_size)
+                if not count:
+                    break
+                moved += count
+                batches += 1
+                time.sleep(self.pause_sec)
+        self.last_run = {
+            "cutoff": cutoff,
+            "archived": moved,
+            "batches": batches,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": datetime.now().isoformat(),
+        }
+        if moved:
+            print(f"🗄️  Archived {moved} transaction(s) older than {older_than_days} day(s) in {batches} batch(es)")
+        return self.last_run
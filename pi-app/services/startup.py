@@ -0,0 +1,43 @@
+"""
+Cold-start timing: where the time goes between launching the API and serving.
+
+run.py imports this first and hands its clock to reload and worker processes
+in MIXION_LAUNCHED_AT; api/app.py marks the end of its imports and of the
+lifespan startup. Each phase is the time since the previous mark, exported as
+mixion_startup_seconds{phase} and reported by /api/admin/status. Without
+run.py (plain `uvicorn api.app:app`) the clock starts when api/app.py is
+imported.
+"""
+
+import os
+import time
+from services import metrics
+
+LAUNCHED_AT_ENV = "MIXION_LAUNCHED_AT"
+
+launched_at = float(os.environ.get(LAUNCHED_AT_ENV) or time.time())
+_last_mark = launched_at
+_phases: dict[str, float] = {}
+
+
+def mark(phase: str) -> float:
+    """Close `phase` and return its duration in seconds."""
+    global _last_mark
+    now = time.time()
+    _phases[phase] = elapsed = now - _last_mark
+    _last_mark = now
+    metrics.STARTUP_SECONDS.set(round(elapsed, 4), phase=phase)
+    return elapsed
+
+
+def report() -> dict:
+    return {
+        "total_sec": round(_last_mark - launched_at, 3),
+        "phases": {phase: round(sec, 3) for phase, sec in _phases.items()},
+    }
+
+
+def summary() -> str:
+    r = report()
+    phases = ", ".join(f"{phase} {sec:.2f}s" for phase, sec in r["phases"].items())
+    return f"{r['total_sec']:.2f}s ({phases})"
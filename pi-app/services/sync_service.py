@@ -0,0 +1,175 @@
+import gzip
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from db.database import Database
+from db.repositories.sync_repo import SyncRepository
+
+logger = logging.getLogger(__name__)
+
+
+class SyncService:
+    """
+    Drains the local sync outbox to the central server in the background.
+
+    Each batch is at most sync_batch_size records / sync_max_batch_bytes of
+    NDJSON, gzip'd and POSTed in one request. A batch goes out as soon as a
+    full one is waiting, or sync_interval_sec after the last attempt
+    otherwise. The server replies {"acked_through": <id>} (or any 2xx to
+    acknowledge the whole batch); failures back off exponentially with
+    jitter. Every record carries its own idempotency key and the batch id is
+    derived from the row range, so a retried batch is recognisable upstream.
+    """
+
+    def __init__(self, db: Database | None = None, config_path: str | None = None):
+        self.repo = SyncRepository(db or Database.shared())
+        self.url = ""
+        self.token = ""
+        self.device_id = socket.gethostname()
+        self.batch_size = 200
+        self.max_batch_bytes = 256 * 1024
+        self.interval_sec = 10.0
+        self.max_backoff_sec = 300.0
+        self.timeout_sec = 15.0
+
+        config_path = config_path or os.path.join(os.path.dirname(__file__), "..", "config.json")
+        try:
+            with open(config_path, "r") as f:
+                config = json.load(f)
+                self.url = config.get("sync_url", "")
+                self.token = config.get("sync_token", "")
+                self.device_id = config.get("sync_device_id") or self.device_id
+                self.batch_size = int(config.get("sync_batch_size", self.batch_size))
+                self.interval_sec = float(config.get("sync_interval_sec", self.interval_sec))
+                self.max_backoff_sec = float(config.get("sync_max_backoff_sec", self.max_backoff_sec))
+        except Exception as e:
+            print(f"⚠️ Could not load config.json: {e}")
+
+        self.failures = 0
+        self.last_error = None
+        self.last_success_at = None
+        self.sent_records = 0
+        self.sent_bytes = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-outbox", daemon=True)
+        self._thread.start()
+        print(f"🔄 Sync enabled → {self.url}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Ask the worker to try a batch now instead of waiting out the interval."""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self.repo.pending_count(),
+            "last_acked_id": self.repo.last_acked_id(),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at,
+            "sent_records": self.sent_records,
+            "sent_bytes": self.sent_bytes,
+        }
+
+    # ── Worker ──────────────────────────────────────────────────────────────
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent, full = self.sync_once()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning("Sync batch failed (%d in a row): %s", self.failures, e)
+                self._sleep(self._backoff())
+                continue
+            if full:
+                continue    # More waiting — keep draining without the interval delay
+            self._sleep(self.interval_sec)
+
+    def _sleep(self, seconds: float):
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def _backoff(self) -> float:
+        # Full jitter: spreads a fleet of Pis that lost Wi-Fi at the same moment
+        ceiling = min(self.max_backoff_sec, self.interval_sec * (2 ** min(self.failures, 16)))
+        return random.uniform(self.interval_sec, max(self.interval_sec, ceiling))
+
+    def sync_once(self) -> tuple[int, bool]:
+        """Send one batch. Returns (records acknowledged, whether the batch was full)."""
+        rows = self.repo.pending(self.batch_size)
+        if not rows:
+            return 0, False
+
+        lines, size = [], 0
+        for row in rows:
+            line = json.dumps({
+                "id": row["id"],
+                "kind": row["kind"],
+                "idempotency_key": row["idempotency_key"],
+                "created_at": row["created_at"],
+                "payload": json.loads(row["payload"]),
+            }, separators=(",", ":")).encode() + b"\n"
+            if lines and size + len(line) > self.max_batch_bytes:
+                break
+            lines.append(line)
+            size += len(line)
+
+        first_id, last_id = rows[0]["id"], rows[len(lines) - 1]["id"]
+        body = gzip.compress(b"".join(lines))
+        acked = self._post(body, f"{self.device_id}-{first_id}-{last_id}", last_id)
+        if acked < first_id:
+            # The server took the batch but committed none of it; retrying at
+            # once would just resend the same rows, so back off like any failure
+            raise RuntimeError(f"Server acknowledged nothing of batch {first_id}-{last_id}")
+        self.repo.ack(acked)
+        count = sum(1 for row in rows[:len(lines)] if row["id"] <= acked)
+        self.failures = 0
+        self.last_error = None
+        self.last_success_at = time.time()
+        self.sent_records += count
+        self.sent_bytes += len(body)
+        return count, len(lines) == self.batch_size or count < len(rows)
+
+    def _post(self, body: bytes, batch_id: str, last_id: int) -> int:
+        headers = {
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+            "X-Device-Id": self.device_id,
+            "X-Batch-Id": batch_id,
+        }
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout_sec) as response:
+            reply = response.read()
+        if not reply:
+            return last_id
+        try:
+            return int(json.loads(reply).get("acked_through", last_id))
+        except (ValueError, AttributeError, TypeError):
+            return last_id
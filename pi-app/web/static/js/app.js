@@ -382,6 +382,8 @@ function setupCardEvents() {
 let pendingOrder = null;
 let selectedExtras = [];
 let isOrdering = false;  // Duplicate-order guard
+let currentOrderId = null;  // order_id of the pour shown on the processing screen
+let currentMsgId = null;    // msg_id of the CMD pouring it (set once dispatched)
 
 function toggleExtra(extraIdStr) {
     const extraId = Number(extraIdStr);
@@ -514,15 +516,50 @@ async function orderDrink(id, drinkPrice = 0, extras = [], extrasTotal = 0, tota
             }, 3000);
             return;
         }
+        const order = await res.json().catch(() => ({}));
+        currentOrderId = order.order_id || null;
+        currentMsgId = order.msg_id || null;
+        if (order.status === 'queued') {
+            document.querySelector('.proc-sub').textContent = `You're #${order.position} in line (about ${Math.ceil(order.eta_sec)}s)`;
+        }
     } catch (e) { console.warn('Order API error', e); }
     finally { isOrdering = false; }  // Always release the lock
 
     setTimeout(() => {
+        document.querySelector('.proc-sub').textContent = 'Please wait while we mix your order...';
         renderSnapMenu();
         showScreen('menu-screen');
     }, 5000);
 }
 
+// ── Live updates (Server-Sent Events) ─────────────────────────────────────────
+let menuReloadTimer = null;
+function scheduleMenuReload() {
+    clearTimeout(menuReloadTimer);
+    menuReloadTimer = setTimeout(loadMenu, 300);
+}
+
+function connectEvents() {
+    if (!window.EventSource) return;
+    const events = new EventSource('/api/events');
+    ['menu', 'inventory', 'device'].forEach(type => events.addEventListener(type, scheduleMenuReload));
+    events.addEventListener('pour', e => {
+        const ev = JSON.parse(e.data);
+        if (!currentMsgId || ev.msg_id !== currentMsgId) return;
+        const sub = document.querySelector('.proc-sub');
+        if (ev.type === 'STARTED')   sub.textContent = 'Pouring...';
+        if (ev.type === 'STEP_DONE') sub.textContent = `Line ${ev.relay} done`;
+        if (ev.type === 'DONE')      sub.textContent = 'Enjoy your drink!';
+    });
+    events.addEventListener('order', e => {
+        const ev = JSON.parse(e.data);
+        if (!currentOrderId || ev.order_id !== currentOrderId) return;
+        if (ev.msg_id) currentMsgId = ev.msg_id;
+        if (ev.status === 'failed') document.querySelector('.proc-sub').textContent = 'Something went wrong — please ask staff.';
+        if (ev.status === 'completed' || ev.status === 'failed') currentOrderId = currentMsgId = null;
+    });
+}
+
 // ── Admin redirect ────────────────────────────────────────────────────────────
 function goAdmin() { window.location.href = '/login'; }
 
@@ -530,3 +567,4 @@ function goAdmin() { window.location.href = '/login'; }
 const splash = document.getElementById('splash-screen');
 splash.style.display = 'flex';
 resetTimer();
+connectEvents();